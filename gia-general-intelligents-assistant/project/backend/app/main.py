@@ -1,14 +1,28 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional, Tuple
+import asyncio
+import base64
+import json
+import os
 import uuid
 from datetime import datetime
 
 from .models.database import engine, async_session, Base
-from .models.task import Task, TaskStep
+from .models.task import TERMINAL_STATUSES, Task, TaskStep
 from .schemas.task import TaskCreate, Task as TaskSchema
 from .services.task_processor import TaskProcessor
+from .services.agents.registry import agent_registry
+from .services.events import task_events
+from .services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from .services.output_store import ENCODING as OUTPUT_ENCODING, output_store
+from .services.task_queue import QueueFullError, task_queue
+from .services.write_batcher import write_batcher
+from .services.worker import TaskWorker, WorkerPool
 
 app = FastAPI(title="Gia - General Intelligence Assistant API")
 
@@ -19,53 +33,255 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Initialize TaskProcessor
+# Initialize TaskProcessor; agents and models are loaded lazily on first use
 task_processor = TaskProcessor()
 
+# Tasks run on TASK_WORKERS worker processes, or on a worker inside this process when 0
+worker_processes = int(os.getenv("TASK_WORKERS", "0"))
+worker = TaskWorker(task_processor) if worker_processes == 0 else None
+worker_pool = WorkerPool(worker_processes) if worker_processes > 0 else None
+worker_runner = None
+
+queue_tasks = metrics.gauge("gia_queue_tasks", "Queued and running tasks, across all workers", ("status",))
+task_submissions = metrics.counter(
+    "gia_task_submissions_total", "Task submissions by outcome (created, idempotent, coalesced)", ("outcome",)
+)
+
 @app.on_event("startup")
 async def startup():
     # Create database tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-@app.post("/tasks/", response_model=TaskSchema)
-async def create_task(task: TaskCreate, background_tasks: BackgroundTasks):
+    # Optionally preload agents (e.g. WARMUP_AGENTS=llm,scraper) without delaying startup
+    warmup_agents = [name.strip() for name in os.getenv("WARMUP_AGENTS", "").split(",") if name.strip()]
+    if warmup_agents and worker is not None:
+        asyncio.create_task(agent_registry.warmup(warmup_agents))
+
+    global worker_runner
+    if worker is not None:
+        worker_runner = asyncio.create_task(worker.run())
+    else:
+        worker_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if worker is not None:
+        await worker.stop()
+        worker_runner.cancel()
+    else:
+        await worker_pool.stop()
+    await agent_registry.cleanup()
+    # Pooled connections hold threads (aiosqlite) that would keep the process alive
+    await engine.dispose()
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "agents": agent_registry.status(),
+        "queue": await task_queue.get_stats(),
+        "writes": write_batcher.get_stats(),
+        "workers": worker.get_status() if worker is not None else worker_pool.get_status()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics of this process and its worker processes in the Prometheus text format"""
+    stats = await task_queue.get_stats()
+    for status in ("pending", "processing"):
+        queue_tasks.set(stats[status], status=status)
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/tasks/", response_model=TaskSchema, status_code=202)
+async def create_task(
+    task: TaskCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """Queue a task.
+
+    A submission with an idempotency key (in the body or the Idempotency-Key header)
+    that was used before returns the task created with it. Unless coalesce is false, a
+    submission identical to a task that is queued, running or completed within
+    TASK_RESULT_TTL seconds returns that task. An existing task is answered with 200.
+    """
+    if task.idempotency_key is None and idempotency_key is not None:
+        task = task.model_copy(update={"idempotency_key": idempotency_key})
     async with async_session() as session:
-        # Create task
+        existing = await _existing_task(session, task)
+        if existing is not None:
+            response.status_code = 200
+            return existing
+
         db_task = await task_processor.create_task(task)
-        
-        # Add to session
-        session.add(db_task)
-        for step in db_task.steps:
-            session.add(step)
-        
+        try:
+            await task_queue.enqueue(session, db_task, priority=task.priority, timeout=task.timeout)
+        except QueueFullError as e:
+            raise _queue_full(e)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # A concurrent submission with the same idempotency key was committed first
+            await session.rollback()
+            existing = await _existing_task(session, task)
+            if existing is None:
+                raise
+            response.status_code = 200
+            return existing
+        task_submissions.inc(outcome="created")
+        db_task.queue_position = await task_queue.position(session, db_task)
+
+    if worker is not None:
+        worker.notify()
+    return db_task
+
+async def _existing_task(session: AsyncSession, task: TaskCreate) -> Optional[Task]:
+    """The task a submission resolves to without creating a new one, if any"""
+    existing = None
+    if task.idempotency_key is not None:
+        existing = await task_queue.find_by_key(session, task.idempotency_key)
+        if existing is not None and existing.description != task.description:
+            raise HTTPException(status_code=409, detail="Idempotency key was already used for a different task")
+        outcome = "idempotent"
+    if existing is None and task.coalesce:
+        existing = await task_queue.find_duplicate(session, task_processor.request_hash(task.description))
+        outcome = "coalesced"
+    if existing is None:
+        return None
+    if existing.status == "pending" and task.priority > existing.priority:
+        # The shared task runs as soon as the most urgent of its submitters asked for
+        existing.priority = task.priority
         await session.commit()
-        await session.refresh(db_task)
-        
-        # Process task in background
-        background_tasks.add_task(process_task_background, db_task.id)
-        
-        return db_task
+    task_submissions.inc(outcome=outcome)
+    existing.queue_position = await task_queue.position(session, existing)
+    return existing
+
+@app.post("/tasks/{task_id}/rerun", response_model=TaskSchema, status_code=202)
+async def rerun_task(task_id: str, from_step: Optional[str] = None):
+    """Queue a finished task again, re-running the workflow from step `from_step` (a node name).
+
+    Steps before it reuse their saved output; without from_step only failed and
+    skipped steps run again.
+    """
+    async with async_session() as session:
+        task = await session.get(Task, task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if task.status in ("pending", "processing"):
+            raise HTTPException(status_code=409, detail=f"Task is {task.status}")
+        try:
+            reset = task_processor.reset_steps(task, from_step)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await output_store.delete(session, reset)
+        try:
+            await task_queue.requeue(session, task)
+        except QueueFullError as e:
+            raise _queue_full(e)
+        await session.commit()
+        task.queue_position = await task_queue.position(session, task)
+
+    if worker is not None:
+        worker.notify()
+    return task
+
+@app.post("/tasks/{task_id}/cancel", response_model=TaskSchema, status_code=202)
+async def cancel_task(task_id: str):
+    """Cancel a task. A pending task is cancelled at once; a running one stops its agents
+    (generation, fetches, containers) as soon as its worker sees the request."""
+    async with async_session() as session:
+        outcome = await task_queue.cancel(session, task_id)
+        await session.commit()
+        task = await session.get(Task, task_id, populate_existing=True)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if outcome is None:
+            raise HTTPException(status_code=409, detail=f"Task is already {task.status}")
+
+    if outcome == "cancelling" and worker is not None:
+        worker.cancel(task_id)
+    return task
+
+def _queue_full(e: QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail={"message": str(e), "queue_depth": e.depth},
+        headers={"Retry-After": str(e.retry_after)}
+    )
 
 @app.get("/tasks/", response_model=List[TaskSchema])
-async def get_tasks():
+async def get_tasks(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[List[str]] = Query(None),
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    include_outputs: bool = True
+):
+    """Tasks newest first, one page at a time.
+
+    The cursor of the next page is returned in the X-Next-Cursor header. With
+    include_outputs=false the task result and step outputs are left out; large step
+    outputs are only previewed either way.
+    """
+    task_columns = [
+        Task.id, Task.description, Task.status, Task.created_at, Task.updated_at,
+        Task.priority, Task.attempts
+    ]
+    step_columns = [
+        TaskStep.id, TaskStep.task_id, TaskStep.name, TaskStep.status, TaskStep.type, TaskStep.position,
+        TaskStep.timing, TaskStep.output_size, TaskStep.output_stored
+    ]
+    if include_outputs:
+        task_columns.append(Task.result)
+        step_columns.append(TaskStep.output)
+
+    query = select(*task_columns).order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1)
+    if status:
+        query = query.where(Task.status.in_(status))
+    if created_after:
+        query = query.where(Task.created_at >= created_after)
+    if created_before:
+        query = query.where(Task.created_at < created_before)
+    if cursor:
+        created_at, task_id = _decode_cursor(cursor)
+        # Keyset pagination: continue strictly after the last row of the previous page
+        query = query.where(or_(
+            Task.created_at < created_at,
+            and_(Task.created_at == created_at, Task.id < task_id)
+        ))
+
     async with async_session() as session:
-        result = await session.execute(
-            "SELECT * FROM tasks ORDER BY created_at DESC"
-        )
-        tasks = result.all()
-        
-        # Fetch steps for each task
-        for task in tasks:
-            steps_result = await session.execute(
-                "SELECT * FROM task_steps WHERE task_id = :task_id",
-                {"task_id": task.id}
+        rows = (await session.execute(query)).mappings().all()
+        tasks = [{**row, "steps": []} for row in rows[:limit]]
+        if tasks:
+            by_id = {task["id"]: task for task in tasks}
+            steps = await session.execute(
+                select(*step_columns)
+                .where(TaskStep.task_id.in_(by_id))
+                .order_by(TaskStep.task_id, TaskStep.position)
             )
-            task.steps = steps_result.all()
-        
-        return tasks
+            for step in steps.mappings():
+                by_id[step["task_id"]]["steps"].append(dict(step))
+
+    if len(rows) > limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(tasks[-1]["created_at"], tasks[-1]["id"])
+    return tasks
+
+def _encode_cursor(created_at: datetime, task_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{task_id}".encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        created_at, task_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), task_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @app.get("/tasks/{task_id}", response_model=TaskSchema)
 async def get_task(task_id: str):
@@ -73,12 +289,84 @@ async def get_task(task_id: str):
         task = await session.get(Task, task_id)
         if task is None:
             raise HTTPException(status_code=404, detail="Task not found")
+        task.queue_position = await task_queue.position(session, task)
         return task
 
-async def process_task_background(task_id: str):
+@app.get("/tasks/{task_id}/steps/{step}/output")
+async def get_step_output(task_id: str, step: str, request: Request):
+    """The whole output of a step (by node name or step id), streamed in chunks.
+
+    Outputs of completed steps are JSON, errors plain text. Large outputs are sent as
+    stored, gzip-compressed, to clients that accept gzip.
+    """
+    async with async_session() as session:
+        row = (await session.execute(
+            select(TaskStep.id, TaskStep.status, TaskStep.output, TaskStep.output_size, TaskStep.output_stored)
+            .where(TaskStep.task_id == task_id, or_(TaskStep.type == step, TaskStep.id == step))
+        )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Step not found")
+    if row.output is None:
+        raise HTTPException(status_code=404, detail="Step has no output")
+    media_type = "application/json" if row.status == "completed" else "text/plain; charset=utf-8"
+    if not row.output_stored:
+        return Response(content=row.output, media_type=media_type)
+
+    data = await output_store.read_compressed(row.id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Step output is missing")
+    if OUTPUT_ENCODING in request.headers.get("accept-encoding", ""):
+        return Response(
+            content=data,
+            media_type=media_type,
+            headers={"Content-Encoding": OUTPUT_ENCODING, "Vary": "Accept-Encoding"}
+        )
+    return StreamingResponse(
+        output_store.decompressed(data),
+        media_type=media_type,
+        headers={"Content-Length": str(row.output_size), "Vary": "Accept-Encoding"}
+    )
+
+@app.get("/tasks/{task_id}/stream")
+async def stream_task(task_id: str):
+    """Server-sent events for step transitions and partial LLM output of a task"""
+    async with async_session() as session:
+        task = await session.get(Task, task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Task not found")
+        snapshot = {"type": "task", "status": task.status, "result": task.result}
+
+    async def events():
+        yield _sse(snapshot)
+        if snapshot["status"] in TERMINAL_STATUSES and not task_events.is_active(task_id):
+            yield _sse({"type": "end"})
+            return
+        async for event in task_events.subscribe(task_id):
+            if event is not None:
+                yield _sse(event)
+                continue
+            # Tasks run by a standalone worker publish no events here, so fall back to the database
+            if not task_events.is_active(task_id):
+                status = await _task_status(task_id)
+                if status is not None and status["status"] in TERMINAL_STATUSES:
+                    yield _sse(status)
+                    yield _sse({"type": "end"})
+                    return
+            # A comment line keeps idle connections open through proxies
+            yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def _task_status(task_id: str):
     async with async_session() as session:
         task = await session.get(Task, task_id)
-        if task:
-            updated_task = await task_processor.process_task(task)
-            session.add(updated_task)
-            await session.commit()
\ No newline at end of file
+        if task is None:
+            return None
+        return {"type": "task", "status": task.status, "result": task.result}
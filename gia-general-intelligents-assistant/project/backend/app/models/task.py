@@ -0,0 +1,83 @@
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, Text
+from sqlalchemy.orm import relationship
+from .database import Base
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+class Task(Base):
+    __tablename__ = "tasks"
+
+    id = Column(String, primary_key=True)
+    description = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    result = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+    # Queue state: higher priority runs first; a claimed task is leased to one worker
+    priority = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+
+    # Seconds a run may take; the deadline is set from it whenever the task is queued
+    timeout = Column(Float)
+    deadline_at = Column(DateTime)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+
+    # Client-chosen key: submitting it again returns this task instead of creating another
+    idempotency_key = Column(String(255), unique=True)
+    # Hash of the description and workflow; identical submissions share a running or recent task
+    request_hash = Column(String(64))
+
+    steps = relationship(
+        "TaskStep",
+        back_populates="task",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="TaskStep.position"
+    )
+
+    __table_args__ = (
+        Index("ix_tasks_queue", "status", "priority", "created_at"),
+        # Newest-first listing pages on (created_at, id), optionally within one status
+        Index("ix_tasks_created_at", "created_at", "id"),
+        Index("ix_tasks_status_created_at", "status", "created_at", "id"),
+        Index("ix_tasks_request_hash", "request_hash", "status"),
+    )
+
+
+class TaskStep(Base):
+    __tablename__ = "task_steps"
+
+    id = Column(String, primary_key=True)
+    task_id = Column(String, ForeignKey("tasks.id"), nullable=False, index=True)
+    name = Column(String, nullable=False)
+    # Index of the node in the workflow's execution order
+    position = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False, default="pending")
+    type = Column(String, nullable=False)
+    # The whole output, or only its beginning when output_stored (full text in task_step_outputs)
+    output = Column(Text)
+    output_size = Column(Integer)
+    output_stored = Column(Boolean, nullable=False, default=False)
+    # Hash of the resolved node inputs that produced output; lets retries reuse the step
+    input_hash = Column(String(64))
+    # JSON timing of the node's last run: ready/start/end seconds into the run, queue_wait, duration
+    timing = Column(Text)
+
+    task = relationship("Task", back_populates="steps")
+
+
+class StepOutput(Base):
+    """Compressed full output of a step too large to keep in its row"""
+    __tablename__ = "task_step_outputs"
+
+    step_id = Column(String, ForeignKey("task_steps.id", ondelete="CASCADE"), primary_key=True)
+    encoding = Column(String(16), nullable=False)
+    # Uncompressed size in bytes
+    size = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
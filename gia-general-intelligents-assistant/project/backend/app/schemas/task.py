@@ -1,12 +1,19 @@
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class TaskStepBase(BaseModel):
     name: str
     status: str
     type: str
+    position: int = 0
+    # Only the beginning of the output when output_stored; read the whole one from
+    # GET /tasks/{task_id}/steps/{step}/output
     output: Optional[str] = None
+    output_size: Optional[int] = None
+    output_stored: bool = False
+    # JSON object with the step's queue_wait and duration in seconds
+    timing: Optional[str] = None
 
 class TaskStepCreate(TaskStepBase):
     pass
@@ -24,12 +31,24 @@ class TaskBase(BaseModel):
     result: Optional[str] = None
 
 class TaskCreate(TaskBase):
-    pass
+    # Higher priorities are taken from the queue first
+    priority: int = 0
+    # Seconds the task may take from submission, including time spent queued
+    timeout: Optional[float] = None
+    # Resubmitting with the same key returns the original task (also read from the Idempotency-Key header)
+    idempotency_key: Optional[str] = Field(None, max_length=255)
+    # Share an identical task that is queued, running or recently completed instead of running again
+    coalesce: bool = True
 
 class Task(TaskBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    priority: int = 0
+    attempts: int = 0
+    deadline_at: Optional[datetime] = None
+    # Pending tasks ahead of this one when it was read; None once it has been claimed
+    queue_position: Optional[int] = None
     steps: List[TaskStep] = []
 
     class Config:
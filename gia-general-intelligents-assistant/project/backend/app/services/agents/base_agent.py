@@ -1,8 +1,53 @@
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional
+from contextvars import ContextVar
+import asyncio
+import functools
+import time
 from loguru import logger
+from ..metrics import metrics
+from ..prompt_assembly import estimate_tokens
+
+agent_seconds = metrics.histogram(
+    "gia_agent_execute_seconds", "Duration of agent execute() calls", ("agent", "status")
+)
+# The agent whose execute() is being measured, so a subclass calling super().execute() counts once
+_measuring: ContextVar[Optional["BaseAgent"]] = ContextVar("measuring", default=None)
+
+
+def _instrumented(execute):
+    @functools.wraps(execute)
+    async def wrapper(self, *args, **kwargs):
+        if _measuring.get() is self:
+            return await execute(self, *args, **kwargs)
+        token = _measuring.set(self)
+        started = time.perf_counter()
+        status = "exception"
+        try:
+            result = await execute(self, *args, **kwargs)
+            status = "error" if isinstance(result, dict) and result.get("status") == "error" else "success"
+            return result
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            _measuring.reset(token)
+            agent_seconds.observe(time.perf_counter() - started, agent=self.__class__.__name__, status=status)
+    return wrapper
+
 
 class BaseAgent(ABC):
+    # Agents that accept an on_token callback in execute() set this to True
+    supports_streaming = False
+    # True when the same input gives the same output, so a recent output may be reused
+    deterministic = False
+
+    def __init_subclass__(cls, **kwargs):
+        # Every execute() implementation is timed, however the agent is called
+        super().__init_subclass__(**kwargs)
+        if "execute" in cls.__dict__:
+            cls.execute = _instrumented(cls.execute)
+
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         self.config = config or {}
         self.context = {}
@@ -13,6 +58,14 @@ class BaseAgent(ABC):
         """Execute the agent's main task"""
         pass
 
+    def count_tokens(self, text: str) -> int:
+        """Tokens `text` takes in this agent's input; agents with a tokenizer count exactly"""
+        return estimate_tokens(text)
+
+    async def warmup(self):
+        """Prepare the agent so its first real call is not slowed by lazy initialization"""
+        pass
+
     async def cleanup(self):
         """Cleanup any resources used by the agent"""
         pass
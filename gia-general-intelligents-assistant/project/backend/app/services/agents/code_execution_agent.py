@@ -1,16 +1,41 @@
 import docker
+import requests
 from typing import Dict, Any
 import asyncio
 import tempfile
+import time
 import os
 from loguru import logger
 from .base_agent import BaseAgent
+from .. import deadline as deadlines
+from .container_pool import (
+    RUNNER_FILE,
+    RUNNER_SCRIPT,
+    ContainerPool,
+    DockerBackend,
+    LocalProcessBackend,
+    parse_run_output,
+    sandbox_run_seconds,
+    sandbox_start_seconds
+)
 
 class CodeExecutionAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
-        self.docker_client = docker.from_env()
-        self.timeout = config.get("timeout", 30) if config else 30
+        self.timeout = self.config.get("timeout", 30)
+        backend = self.config.get("backend", "docker")
+        self.docker_client = docker.from_env() if backend == "docker" else None
+
+        # Warm sandboxes take container start-up off the request path; pool_max_size=0 disables it
+        self.pool = None
+        if self.config.get("pool_max_size", 4) > 0:
+            self.pool = ContainerPool(
+                DockerBackend(self.docker_client) if backend == "docker" else LocalProcessBackend(),
+                min_size=self.config.get("pool_min_size", 1),
+                max_size=self.config.get("pool_max_size", 4),
+                idle_timeout=self.config.get("pool_idle_timeout", 300),
+                recycle=self.config.get("recycle_containers", False)
+            )
 
     async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
         code = task_input.get("code")
@@ -20,7 +45,10 @@ class CodeExecutionAgent(BaseAgent):
             return {"status": "error", "error": "No code provided"}
         
         try:
-            result = await self._execute_in_container(code, language)
+            if self.pool is not None:
+                result = await self._execute_in_pool(code, language)
+            else:
+                result = await self._execute_in_container(code, language)
             return {
                 "status": "success",
                 "result": result,
@@ -33,6 +61,52 @@ class CodeExecutionAgent(BaseAgent):
                 "error": str(e)
             }
 
+    def _run_timeout(self) -> float:
+        # The snippet must finish by the node's deadline, leaving a little time to collect its output
+        left = deadlines.remaining()
+        if left is None:
+            return self.timeout
+        if left <= 1:
+            raise deadlines.DeadlineExceeded("Not enough time left to run the code")
+        return min(self.timeout, left - 1)
+
+    async def _execute_in_pool(self, code: str, language: str) -> Dict[str, Any]:
+        file_name = f"source{'.py' if language == 'python' else '.txt'}"
+        timeout = self._run_timeout()
+        # Leaving the lease with an exception, including cancellation, makes the pool
+        # destroy the sandbox, which also kills a snippet that is still running
+        async with self.pool.lease() as container:
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(self.pool.backend.run, container, code, file_name, timeout),
+                    timeout=timeout + 10
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Execution timeout after {timeout:.1f}s")
+            wall_time = time.perf_counter() - started
+            sandbox_run_seconds.observe(wall_time, backend=self.pool.backend.name)
+
+        return self._format_result(parse_run_output(result["output"], result["exit_code"], wall_time), timeout)
+
+    def _format_result(self, result: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        if result["exit_status"] == "timeout":
+            return {"error": "Execution timeout", "timeout": timeout, **result}
+        return result
+
+    async def warmup(self):
+        if self.pool is not None:
+            await self.pool.start()
+
+    async def cleanup(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["pool"] = self.pool.get_status() if self.pool is not None else None
+        return status
+
     async def _execute_in_container(self, code: str, language: str) -> Dict[str, Any]:
         with tempfile.TemporaryDirectory() as temp_dir:
             # Create source file
@@ -41,11 +115,16 @@ class CodeExecutionAgent(BaseAgent):
             
             with open(source_file, "w") as f:
                 f.write(code)
+            with open(os.path.join(temp_dir, RUNNER_FILE), "w") as f:
+                f.write(RUNNER_SCRIPT)
             
             # Configure container
+            timeout = self._run_timeout()
             container_config = {
                 "image": "python:3.9-slim",
-                "command": f"python /code/source{file_extension}",
+                "command": [
+                    "python", f"/code/{RUNNER_FILE}", f"/code/source{file_extension}", str(timeout)
+                ],
                 "volumes": {
                     temp_dir: {
                         "bind": "/code",
@@ -58,42 +137,39 @@ class CodeExecutionAgent(BaseAgent):
                 "network_disabled": True
             }
             
+            # Docker SDK calls block, so they run in worker threads
+            container = None
+            started = time.perf_counter()
             try:
-                container = self.docker_client.containers.run(
+                container = await asyncio.to_thread(
+                    self.docker_client.containers.run,
                     **container_config,
                     detach=True
                 )
+                running = time.perf_counter()
+                sandbox_start_seconds.observe(running - started, backend="docker")
                 
-                # Wait for execution with timeout
+                # The daemon's wait endpoint returns when the container exits; the runner
+                # enforces the timeout itself, the extra margin covers container start-up
                 try:
-                    await asyncio.wait_for(
-                        self._wait_for_container(container),
-                        timeout=self.timeout
-                    )
-                    
-                    logs = container.logs().decode()
-                    exit_code = container.wait()["StatusCode"]
-                    
-                    return {
-                        "output": logs,
-                        "exit_code": exit_code,
-                        "execution_time": self.timeout  # Approximate
-                    }
-                    
-                except asyncio.TimeoutError:
-                    container.kill()
+                    state = await asyncio.to_thread(container.wait, timeout=timeout + 10)
+                except requests.exceptions.RequestException:
+                    await asyncio.to_thread(container.kill)
                     return {
                         "error": "Execution timeout",
-                        "timeout": self.timeout
+                        "timeout": timeout,
+                        "execution_time": time.perf_counter() - started
                     }
+                wall_time = time.perf_counter() - started
+                sandbox_run_seconds.observe(time.perf_counter() - running, backend="docker")
+
+                logs = (await asyncio.to_thread(container.logs)).decode(errors="replace")
+                return self._format_result(parse_run_output(logs, state["StatusCode"], wall_time), timeout)
                     
             finally:
-                try:
-                    container.remove(force=True)
-                except Exception as e:
-                    logger.error(f"Error removing container: {str(e)}")
-
-    async def _wait_for_container(self, container) -> None:
-        while container.status != "exited":
-            await asyncio.sleep(0.1)
-            container.reload()
\ No newline at end of file
+                # Also reached on cancellation: force-removing kills a snippet that is still running
+                if container is not None:
+                    try:
+                        await asyncio.to_thread(container.remove, force=True)
+                    except Exception as e:
+                        logger.error(f"Error removing container: {str(e)}")
@@ -0,0 +1,394 @@
+from typing import Dict, Any, Deque, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import io
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from loguru import logger
+from ..metrics import metrics
+
+SOURCE_DIR = "/tmp/code"
+RUNNER_FILE = "_runner.py"
+METRICS_MARKER = "__GIA_RUN_METRICS__"
+
+sandbox_start_seconds = metrics.histogram(
+    "gia_sandbox_start_seconds", "Time to start a sandbox container", ("backend",)
+)
+sandbox_acquire_seconds = metrics.histogram(
+    "gia_sandbox_acquire_seconds", "Time an execution waited for a sandbox (warm: taken from the pool)",
+    ("backend", "warm")
+)
+sandbox_run_seconds = metrics.histogram(
+    "gia_sandbox_run_seconds", "Time spent running code inside a started sandbox", ("backend",)
+)
+
+# Runs the snippet as a child process and appends its resource usage to the output.
+# Only one child is ever started, so RUSAGE_CHILDREN is exactly the snippet's usage.
+RUNNER_SCRIPT = f"""
+import json, resource, subprocess, sys, time
+source, timeout = sys.argv[1], float(sys.argv[2])
+started = time.perf_counter()
+child = subprocess.Popen([sys.executable, source])
+timed_out = False
+try:
+    child.wait(timeout=timeout)
+except subprocess.TimeoutExpired:
+    child.kill()
+    child.wait()
+    timed_out = True
+run_time = time.perf_counter() - started
+usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+code = child.returncode if child.returncode >= 0 else 128 - child.returncode
+sys.stdout.flush()
+sys.stdout.write("\\n{METRICS_MARKER}" + json.dumps({{
+    "run_time": run_time,
+    "cpu_time": usage.ru_utime + usage.ru_stime,
+    "peak_memory_bytes": usage.ru_maxrss * 1024,
+    "timed_out": timed_out
+}}) + "\\n")
+sys.exit(code)
+"""
+
+
+def parse_run_output(output: str, exit_code: int, wall_time: float) -> Dict[str, Any]:
+    """Split the runner's metrics line off the captured output"""
+    head, marker, tail = output.rpartition("\n" + METRICS_MARKER)
+    metrics = {}
+    if marker:
+        try:
+            metrics = json.loads(tail.strip())
+            output = head
+        except ValueError:
+            pass
+
+    timed_out = metrics.get("timed_out", False)
+    if timed_out:
+        exit_status = "timeout"
+    elif exit_code == 137:
+        # SIGKILL without our timeout: the memory limit was hit
+        exit_status = "killed"
+    else:
+        exit_status = "exited"
+
+    return {
+        "output": output,
+        "exit_code": exit_code,
+        "exit_status": exit_status,
+        "execution_time": wall_time,
+        "run_time": metrics.get("run_time"),
+        "cpu_time": metrics.get("cpu_time"),
+        "peak_memory_bytes": metrics.get("peak_memory_bytes")
+    }
+
+
+def build_archive(files: Dict[str, str]) -> bytes:
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w") as tar:
+        for name, content in files.items():
+            data = content.encode()
+            info = tarfile.TarInfo(name=name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+    return archive.getvalue()
+
+
+class DockerBackend:
+    """Sandbox containers kept alive with `sleep` and fed code through `docker exec`"""
+    name = "docker"
+
+    def __init__(
+        self,
+        client,
+        image: str = "python:3.9-slim",
+        mem_limit: str = "100m",
+        cpu_period: int = 100000,
+        cpu_quota: int = 50000
+    ):
+        self.client = client
+        self.image = image
+        self.mem_limit = mem_limit
+        self.cpu_period = cpu_period
+        self.cpu_quota = cpu_quota
+
+    def create(self):
+        return self.client.containers.run(
+            image=self.image,
+            command=["sleep", "infinity"],
+            mem_limit=self.mem_limit,
+            cpu_period=self.cpu_period,
+            cpu_quota=self.cpu_quota,
+            network_disabled=True,
+            labels={"gia.sandbox": "pool"},
+            detach=True
+        )
+
+    def run(self, container, code: str, file_name: str, timeout: float) -> Dict[str, Any]:
+        container.put_archive("/tmp", build_archive({
+            f"code/{file_name}": code,
+            f"code/{RUNNER_FILE}": RUNNER_SCRIPT
+        }))
+        result = container.exec_run(
+            ["python", f"{SOURCE_DIR}/{RUNNER_FILE}", f"{SOURCE_DIR}/{file_name}", str(timeout)]
+        )
+        return {"output": result.output.decode(errors="replace"), "exit_code": result.exit_code}
+
+    def reset(self, container):
+        container.exec_run(["sh", "-c", f"rm -rf {SOURCE_DIR}"])
+
+    def destroy(self, container):
+        container.remove(force=True)
+
+
+class LocalProcessBackend:
+    """Runs snippets as local subprocesses in throwaway directories.
+
+    Provides no isolation at all; it stands in for the Docker daemon in tests and
+    development setups without Docker.
+    """
+    name = "local"
+
+    def __init__(self):
+        self._processes: Dict[str, subprocess.Popen] = {}
+
+    def create(self) -> str:
+        return tempfile.mkdtemp(prefix="gia-sandbox-")
+
+    def run(self, container: str, code: str, file_name: str, timeout: float) -> Dict[str, Any]:
+        for name, content in ((file_name, code), (RUNNER_FILE, RUNNER_SCRIPT)):
+            with open(os.path.join(container, name), "w") as f:
+                f.write(content)
+        process = subprocess.Popen(
+            [sys.executable, RUNNER_FILE, file_name, str(timeout)],
+            cwd=container,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Own process group, so destroy() can kill the runner together with the snippet
+            start_new_session=True
+        )
+        self._processes[container] = process
+        try:
+            output, _ = process.communicate(timeout=timeout + 10)
+        except subprocess.TimeoutExpired:
+            self._kill(process)
+            raise
+        finally:
+            self._processes.pop(container, None)
+        return {"output": output.decode(errors="replace"), "exit_code": process.returncode}
+
+    def reset(self, container: str):
+        for name in os.listdir(container):
+            path = os.path.join(container, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    def destroy(self, container: str):
+        process = self._processes.pop(container, None)
+        if process is not None:
+            self._kill(process)
+        shutil.rmtree(container, ignore_errors=True)
+
+    @staticmethod
+    def _kill(process: subprocess.Popen):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+class ContainerPool:
+    """Pool of pre-started sandboxes that grows on demand between min_size and max_size.
+
+    Each execution leases a clean sandbox. By default a used sandbox is destroyed and a
+    fresh one is started in the background, keeping cold starts off the request path;
+    with recycle=True it is wiped and reused instead. Sandboxes idle for longer than
+    idle_timeout are stopped while the pool is above min_size.
+    """
+
+    def __init__(
+        self,
+        backend,
+        min_size: int = 1,
+        max_size: int = 4,
+        idle_timeout: float = 300,
+        recycle: bool = False
+    ):
+        self.backend = backend
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.idle_timeout = idle_timeout
+        self.recycle = recycle
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._size = 0  # idle + leased + starting
+        self._condition = asyncio.Condition()
+        self._background: set = set()
+        self._reaper: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats = {"created": 0, "destroyed": 0, "leases": 0, "warm_leases": 0, "waits": 0}
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    async def start(self):
+        """Pre-start min_size sandboxes and start stopping idle ones"""
+        if self._reaper is None:
+            self._reaper = asyncio.ensure_future(self._reap())
+        await asyncio.gather(*(self._add_idle() for _ in range(self.min_size - self._size)))
+
+    @asynccontextmanager
+    async def lease(self):
+        container = await self.acquire()
+        healthy = True
+        try:
+            yield container
+        except BaseException:
+            healthy = False
+            raise
+        finally:
+            await self.release(container, healthy=healthy)
+
+    async def acquire(self):
+        if self._closed:
+            raise RuntimeError("Container pool is closed")
+        self.stats["leases"] += 1
+        started = time.perf_counter()
+        async with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                self.stats["waits"] += 1
+                await self._condition.wait()
+            if self._idle:
+                container, _ = self._idle.pop()
+                self.stats["warm_leases"] += 1
+                self._replenish()
+                sandbox_acquire_seconds.observe(time.perf_counter() - started, backend=self.backend.name, warm="true")
+                return container
+            self._size += 1
+
+        try:
+            container = await self._create()
+            sandbox_acquire_seconds.observe(time.perf_counter() - started, backend=self.backend.name, warm="false")
+            return container
+        except Exception:
+            await self._forget()
+            raise
+
+    async def release(self, container, healthy: bool = True):
+        if self.recycle and healthy and not self._closed:
+            try:
+                await asyncio.to_thread(self.backend.reset, container)
+                async with self._condition:
+                    self._idle.append((container, time.monotonic()))
+                    self._condition.notify()
+                self._shrink()
+                return
+            except Exception as e:
+                logger.error(f"Error resetting sandbox, replacing it: {str(e)}")
+
+        self._spawn(self._destroy(container))
+        await self._forget()
+        self._replenish()
+        self._shrink()
+
+    async def close(self):
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for task in list(self._background):
+            task.cancel()
+        while self._idle:
+            container, _ = self._idle.popleft()
+            await self._destroy(container)
+            self._size -= 1
+
+    async def _add_idle(self):
+        async with self._condition:
+            if self._size >= self.max_size:
+                return
+            self._size += 1
+        try:
+            container = await self._create()
+        except Exception as e:
+            logger.error(f"Error starting sandbox container: {str(e)}")
+            await self._forget()
+            return
+        if self._closed:
+            await self._destroy(container)
+            await self._forget()
+            return
+        async with self._condition:
+            self._idle.append((container, time.monotonic()))
+            self._condition.notify()
+
+    async def _create(self):
+        started = time.perf_counter()
+        container = await asyncio.to_thread(self.backend.create)
+        sandbox_start_seconds.observe(time.perf_counter() - started, backend=self.backend.name)
+        self.stats["created"] += 1
+        return container
+
+    async def _destroy(self, container):
+        try:
+            await asyncio.to_thread(self.backend.destroy, container)
+            self.stats["destroyed"] += 1
+        except Exception as e:
+            logger.error(f"Error removing sandbox container: {str(e)}")
+
+    async def _forget(self):
+        async with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _replenish(self):
+        # Keep a warm spare for the next caller, within the size bounds
+        if self._closed:
+            return
+        missing = max(self.min_size - self._size, 0)
+        if not self._idle and self._size < self.max_size:
+            missing = max(missing, 1)
+        for _ in range(missing):
+            self._spawn(self._add_idle())
+
+    async def _reap(self):
+        # Releases shrink the pool too, but without traffic nothing else would
+        while True:
+            await asyncio.sleep(max(self.idle_timeout / 2, 0.05))
+            self._shrink()
+
+    def _shrink(self):
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            container, _ = self._idle.popleft()
+            self._size -= 1
+            self._spawn(self._destroy(container))
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            **self.stats
+        }
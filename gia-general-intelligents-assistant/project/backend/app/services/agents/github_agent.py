@@ -1,12 +1,67 @@
-from typing import Dict, Any, List
-from github import Github
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import os
+import re
 from loguru import logger
 from .base_agent import BaseAgent
+from .github_cache import GitHubCache
+from .github_client import AsyncGitHubClient
+
+# GitHub rejects search queries longer than 256 characters
+MAX_QUERY_LENGTH = 256
+TRUNCATION_MARKER = "\n# ... truncated\n"
+
+
+def select_code_files(
+    listings: List[List[Dict[str, Any]]],
+    max_total_bytes: int,
+    max_file_bytes: int,
+    min_file_bytes: int = 256
+) -> List[Tuple[int, Dict[str, Any], int]]:
+    """Pick files to fetch so their combined size stays within max_total_bytes.
+
+    Takes one file per repository in turn (repositories in ranking order, smallest files
+    first) so samples come from several projects; each file is capped at max_file_bytes.
+    Returns (repository index, listing entry, byte limit) triples.
+    """
+    queues = [sorted(files, key=lambda f: f.get("size", 0)) for files in listings]
+    selected = []
+    remaining = max_total_bytes
+    while remaining >= min_file_bytes and any(queues):
+        for index, queue in enumerate(queues):
+            if not queue or remaining < min_file_bytes:
+                continue
+            entry = queue.pop(0)
+            limit = min(entry.get("size", 0), max_file_bytes, remaining)
+            if limit <= 0:
+                continue
+            selected.append((index, entry, limit))
+            remaining -= limit
+    return selected
+
 
 class GitHubAgent(BaseAgent):
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
-        self.github = Github()  # For unauthenticated access
+        # Unauthenticated access unless a token is configured
+        self.github = AsyncGitHubClient(
+            token=self.config.get("token", os.getenv("GITHUB_TOKEN")),
+            base_url=self.config.get("api_url", "https://api.github.com"),
+            max_concurrency=self.config.get("max_concurrency", 8),
+            max_rate_limit_wait=self.config.get("max_rate_limit_wait", 300)
+        )
+        self.max_repositories = self.config.get("max_repositories", 5)
+        # Code samples end up in the generate_code prompt, so their total size is bounded
+        self.max_sample_bytes = self.config.get("max_sample_bytes", 24 * 1024)
+        self.max_file_bytes = self.config.get("max_file_bytes", 8 * 1024)
+
+        self.cache: Optional[GitHubCache] = None
+        if self.config.get("cache", True):
+            self.cache = GitHubCache(
+                self.config.get("cache_path", os.path.join(os.getenv("CACHE_DIR", "./cache"), "github.db")),
+                ttl=self.config.get("cache_ttl", 3600),
+                max_blob_bytes=self.config.get("cache_max_bytes", 64 * 1024 * 1024)
+            )
 
     async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
         query = task_input.get("query") or task_input.get("description")
@@ -28,23 +83,30 @@ class GitHubAgent(BaseAgent):
             }
 
     async def _search_repositories(self, query: str, language: str) -> List[Dict[str, Any]]:
-        search_query = f"{query} language:{language}"
+        qualifier = f" language:{language}"
+        search_query = re.sub(r"\s+", " ", query or "").strip()[:MAX_QUERY_LENGTH - len(qualifier)] + qualifier
         repositories = []
         
         try:
-            results = self.github.search_repositories(
-                query=search_query,
-                sort="stars",
-                order="desc"
-            )
+            cache_key = f"search:{self.max_repositories}:{search_query}"
+            results = await self._cached_json(cache_key)
+            if results is None:
+                results = await self.github.search_repositories(
+                    search_query,
+                    sort="stars",
+                    order="desc",
+                    per_page=self.max_repositories
+                )
+                await self._store_json(cache_key, results)
             
-            for repo in results[:5]:  # Limit to top 5 results
+            for repo in results[:self.max_repositories]:
                 repositories.append({
-                    "name": repo.name,
-                    "url": repo.html_url,
-                    "description": repo.description,
-                    "stars": repo.stargazers_count,
-                    "language": repo.language
+                    "name": repo["name"],
+                    "full_name": repo["full_name"],
+                    "url": repo["html_url"],
+                    "description": repo.get("description"),
+                    "stars": repo.get("stargazers_count"),
+                    "language": repo.get("language")
                 })
         except Exception as e:
             logger.error(f"Error searching repositories: {str(e)}")
@@ -52,22 +114,76 @@ class GitHubAgent(BaseAgent):
         return repositories
 
     async def _extract_code_samples(self, repositories: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        code_samples = []
-        
-        for repo in repositories:
-            try:
-                repo_obj = self.github.get_repo(repo["name"])
-                contents = repo_obj.get_contents("")
-                
-                for content in contents:
-                    if content.type == "file" and content.name.endswith(".py"):
-                        code_samples.append({
-                            "repository": repo["name"],
-                            "file_name": content.name,
-                            "code": content.decoded_content.decode(),
-                            "url": content.html_url
-                        })
-            except Exception as e:
-                logger.error(f"Error extracting code from {repo['name']}: {str(e)}")
-                
-        return code_samples
\ No newline at end of file
+        # Listings are fetched concurrently; files are chosen from listed sizes before any download
+        listings = await asyncio.gather(*(self._list_python_files(repo) for repo in repositories))
+        selected = select_code_files(listings, self.max_sample_bytes, self.max_file_bytes)
+        fetched = await asyncio.gather(
+            *(self._fetch_file(repositories[index], entry) for index, entry, _ in selected),
+            return_exceptions=True
+        )
+
+        samples = []
+        for (index, entry, limit), code in zip(selected, fetched):
+            repo = repositories[index]
+            if isinstance(code, Exception):
+                logger.error(f"Error fetching {repo['full_name']}/{entry['path']}: {str(code)}")
+                continue
+            truncated = len(code.encode()) > limit
+            if truncated:
+                code = code.encode()[:limit].decode(errors="ignore") + TRUNCATION_MARKER
+            samples.append({
+                "repository": repo["name"],
+                "file_name": entry["name"],
+                "code": code,
+                "url": entry["html_url"],
+                "truncated": truncated
+            })
+        return samples
+
+    async def _list_python_files(self, repo: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            cache_key = f"contents:{repo['full_name']}:"
+            contents = await self._cached_json(cache_key)
+            if contents is None:
+                contents = await self.github.get_contents(repo["full_name"])
+                await self._store_json(cache_key, contents)
+        except Exception as e:
+            logger.error(f"Error extracting code from {repo['name']}: {str(e)}")
+            return []
+        return [
+            content for content in contents
+            if content["type"] == "file" and content["name"].endswith(".py")
+        ]
+
+    async def _fetch_file(self, repo: Dict[str, Any], entry: Dict[str, Any]) -> str:
+        """File text, downloaded only if this blob SHA has not been fetched before"""
+        if self.cache is not None:
+            code = await asyncio.to_thread(self.cache.get_blob, repo["full_name"], entry["path"], entry["sha"])
+            if code is not None:
+                return code
+        file = await self.github.get_file(repo["full_name"], entry["path"])
+        if self.cache is not None:
+            await asyncio.to_thread(
+                self.cache.put_blob, repo["full_name"], entry["path"], entry["sha"], file["decoded_content"]
+            )
+        return file["decoded_content"]
+
+    async def _cached_json(self, key: str) -> Optional[Any]:
+        if self.cache is None:
+            return None
+        return await asyncio.to_thread(self.cache.get_json, key)
+
+    async def _store_json(self, key: str, value: Any):
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set_json, key, value)
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["client"] = self.github.get_status()
+        status["cache"] = self.cache.get_stats() if self.cache else None
+        return status
+
+    async def cleanup(self):
+        await self.github.close()
+        if self.cache is not None:
+            self.cache.close()
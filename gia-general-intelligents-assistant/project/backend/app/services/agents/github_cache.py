@@ -0,0 +1,124 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from ..metrics import cache_lookups
+
+
+class GitHubCache:
+    """On-disk cache for the GitHub agent in SQLite.
+
+    File contents are keyed by (repository, path, blob SHA), so an unchanged file is
+    never downloaded twice; search results and directory listings are cached as JSON
+    with a TTL. File contents are evicted least-recently-used beyond max_blob_bytes.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, max_blob_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_blob_bytes = max_blob_bytes
+        self.stats = {"query_hits": 0, "query_misses": 0, "blob_hits": 0, "blob_misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires_at REAL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                repository TEXT,
+                path TEXT,
+                sha TEXT,
+                content BLOB,
+                size INTEGER,
+                last_access REAL,
+                PRIMARY KEY (repository, path, sha)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_blobs_last_access ON blobs (last_access)")
+        self._blob_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def get_json(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        self.stats["query_hits" if row else "query_misses"] += 1
+        cache_lookups.inc(cache="github_query", result="hit" if row else "miss")
+        return json.loads(row[0]) if row else None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+
+    def get_blob(self, repository: str, path: str, sha: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content FROM blobs WHERE repository = ? AND path = ? AND sha = ?",
+                (repository, path, sha)
+            ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE blobs SET last_access = ? WHERE repository = ? AND path = ? AND sha = ?",
+                    (time.time(), repository, path, sha)
+                )
+        self.stats["blob_hits" if row else "blob_misses"] += 1
+        cache_lookups.inc(cache="github_blob", result="hit" if row else "miss")
+        return zlib.decompress(row[0]).decode(errors="replace") if row else None
+
+    def put_blob(self, repository: str, path: str, sha: str, content: str):
+        compressed = zlib.compress(content.encode(), 6)
+        with self._lock:
+            # Any older version of the file is replaced; it can no longer be served
+            previous = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM blobs WHERE repository = ? AND path = ?",
+                (repository, path)
+            ).fetchone()[0]
+            self._db.execute("DELETE FROM blobs WHERE repository = ? AND path = ?", (repository, path))
+            self._db.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                (repository, path, sha, compressed, len(compressed), time.time())
+            )
+            self._blob_bytes += len(compressed) - previous
+            self._evict()
+
+    def _evict(self):
+        if self._blob_bytes <= self.max_blob_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT repository, path, sha, size FROM blobs ORDER BY last_access"
+        ).fetchall()
+        evicted = []
+        for repository, path, sha, size in rows:
+            if self._blob_bytes <= self.max_blob_bytes * 0.9:
+                break
+            evicted.append((repository, path, sha))
+            self._blob_bytes -= size
+        self._db.executemany(
+            "DELETE FROM blobs WHERE repository = ? AND path = ? AND sha = ?",
+            evicted
+        )
+        self.stats["evictions"] += len(evicted)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "blob_bytes": self._blob_bytes, "max_blob_bytes": self.max_blob_bytes}
@@ -0,0 +1,195 @@
+from typing import Dict, Any, List, Optional
+from urllib.parse import quote
+import asyncio
+import base64
+import time
+import aiohttp
+from loguru import logger
+from .. import deadline as deadlines
+
+
+class GitHubAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"GitHub API error {status}: {message}")
+        self.status = status
+
+
+class RateLimiter:
+    """Tracks X-RateLimit-* headers per resource and paces requests to stay under the limit.
+
+    Requests are delayed (queued) rather than failed: once the remaining budget reaches
+    the reserve, callers wait until the window resets; while the budget is low, requests
+    are spread evenly over the rest of the window. A caller whose turn is further away
+    than it may wait gets GitHubAPIError instead.
+    """
+
+    def __init__(self, reserve: int = 1, slow_down_ratio: float = 0.2):
+        self.reserve = reserve
+        self.slow_down_ratio = slow_down_ratio
+        self.limits: Dict[str, Dict[str, float]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Time the last admitted request goes at, per resource; later requests queue behind it
+        self._next: Dict[str, float] = {}
+
+    async def acquire(self, resource: str, max_wait: Optional[float] = None) -> float:
+        """Wait for this request's turn and return how long that took"""
+        lock = self._locks.setdefault(resource, asyncio.Lock())
+        async with lock:
+            now = time.time()
+            delay = self._turn(resource, now) - now
+            if max_wait is not None and delay > max_wait:
+                raise GitHubAPIError(429, f"Rate limit for {resource} not reset within {max(max_wait, 0):.0f}s")
+            if resource in self.limits:
+                # Count the request now so concurrent callers see the reduced budget
+                self.limits[resource]["remaining"] -= 1
+                self._next[resource] = now + delay
+        # The turn is reserved, so the lock is not held while waiting for it
+        if delay > 0:
+            logger.info(f"GitHub {resource} rate limit low, waiting {delay:.1f}s")
+            await asyncio.sleep(delay)
+        return max(delay, 0)
+
+    def _turn(self, resource: str, now: float) -> float:
+        state = self.limits.get(resource)
+        if state is None:
+            return now
+        start = max(now, self._next.get(resource, now))
+        if state["reset"] <= start:
+            # The window has reset by the time this request goes
+            state["remaining"] = state["limit"]
+            return start
+
+        window = state["reset"] - start
+        if state["remaining"] <= self.reserve:
+            return state["reset"] + 1
+        if state["remaining"] < state["limit"] * self.slow_down_ratio:
+            return start + window / state["remaining"]
+        return start
+
+    def update(self, headers) -> Optional[str]:
+        resource = headers.get("X-RateLimit-Resource")
+        if resource is None or "X-RateLimit-Remaining" not in headers:
+            return resource
+        self.limits[resource] = {
+            "limit": float(headers.get("X-RateLimit-Limit", 60)),
+            "remaining": float(headers["X-RateLimit-Remaining"]),
+            "reset": float(headers.get("X-RateLimit-Reset", time.time() + 60))
+        }
+        return resource
+
+    def reset_delay(self, resource: str) -> float:
+        state = self.limits.get(resource)
+        return max(state["reset"] - time.time(), 0) + 1 if state else 60
+
+
+class AsyncGitHubClient:
+    """Minimal asyncio client for the GitHub REST API with pooled connections and rate limiting"""
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        base_url: str = "https://api.github.com",
+        max_concurrency: int = 8,
+        timeout: float = 20,
+        max_rate_limit_wait: float = 300
+    ):
+        self.token = token
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.rate_limiter = RateLimiter()
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            headers = {
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": "2022-11-28",
+                "User-Agent": "gia-assistant"
+            }
+            if self.token:
+                headers["Authorization"] = f"Bearer {self.token}"
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            )
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def request(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        session = self._get_session()
+        resource = "search" if path.startswith("/search/") else "core"
+        waited = 0.0
+        while True:
+            # Pace first so a request waiting on one resource's budget does not hold a connection slot
+            waited += await self.rate_limiter.acquire(resource, self._max_wait(waited))
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                timeout = aiohttp.ClientTimeout(total=deadlines.clamp(self.timeout.total))
+                async with session.get(f"{self.base_url}{path}", params=params, timeout=timeout) as response:
+                    resource = self.rate_limiter.update(response.headers) or resource
+                    if response.status in (403, 429) and (
+                        response.headers.get("X-RateLimit-Remaining") == "0"
+                        or "Retry-After" in response.headers
+                    ):
+                        retry_after = response.headers.get("Retry-After", "")
+                        delay = float(retry_after) if retry_after.isdigit() else self.rate_limiter.reset_delay(resource)
+                    elif response.status >= 400:
+                        body = await response.text()
+                        raise GitHubAPIError(response.status, body[:200])
+                    else:
+                        return await response.json()
+
+            # Rate limited: queue behind the reset instead of failing, up to a bound
+            self.stats["rate_limited"] += 1
+            max_wait = self._max_wait(waited)
+            if delay > max_wait:
+                raise GitHubAPIError(429, f"Rate limit for {resource} not reset within {max(max_wait, 0):.0f}s")
+            logger.warning(f"GitHub {resource} rate limit hit, retrying in {delay:.1f}s")
+            waited += delay
+            await asyncio.sleep(delay)
+
+    def _max_wait(self, waited: float) -> float:
+        """How much longer a request may wait for the rate limit, after `waited` seconds so far"""
+        max_wait = self.max_rate_limit_wait - waited
+        if deadlines.remaining() is not None:
+            max_wait = min(max_wait, deadlines.remaining())
+        return max_wait
+
+    async def search_repositories(
+        self,
+        query: str,
+        sort: str = "stars",
+        order: str = "desc",
+        per_page: int = 5
+    ) -> List[Dict[str, Any]]:
+        result = await self.request(
+            "/search/repositories",
+            {"q": query, "sort": sort, "order": order, "per_page": per_page}
+        )
+        return result.get("items", [])
+
+    async def get_contents(self, full_name: str, path: str = "") -> Any:
+        return await self.request(f"/repos/{full_name}/contents/{quote(path)}")
+
+    async def get_file(self, full_name: str, path: str) -> Dict[str, Any]:
+        """File metadata with its decoded text in "decoded_content" """
+        content = await self.get_contents(full_name, path)
+        encoded = content.get("content") or ""
+        content["decoded_content"] = base64.b64decode(encoded).decode(errors="replace")
+        return content
+
+    def get_status(self) -> Dict[str, Any]:
+        return {**self.stats, "rate_limits": self.rate_limiter.limits}
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
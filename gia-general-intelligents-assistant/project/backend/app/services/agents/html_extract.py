@@ -0,0 +1,165 @@
+"""Single-pass HTML text extraction for the scraper.
+
+Built on the standard library's event-based HTMLParser so it can run in lightweight
+worker processes and stop as soon as the primary content has been read, instead of
+building a full document tree.
+"""
+from typing import Dict, Any, List, Optional
+from html.parser import HTMLParser
+import re
+
+# <head> is not skipped as a whole: its </head> is optional, and an unclosed one would
+# swallow the body. What it holds besides <title> is skipped or void anyway.
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "canvas"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = HEADING_TAGS | {
+    "p", "div", "section", "li", "pre", "blockquote", "tr", "td", "th", "dd", "dt",
+    "figcaption", "header", "footer", "nav", "aside", "table", "ul", "ol", "br", "hr",
+    "main", "article", "body"
+}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+FEED_SIZE = 64 * 1024
+WHITESPACE = re.compile(r"\s+")
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _ContentParser(HTMLParser):
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title: Optional[str] = None
+        self._title_parts: Optional[List[str]] = None
+        self._skip_depth = 0
+        self._stack: List[str] = []
+
+        # Content of the first <main>/<article> is preferred; the whole body is the fallback
+        self.primary: Optional[Dict[str, Any]] = None
+        self._primary_depth: Optional[int] = None
+        self.primary_closed = False
+        self.body = {"tag": "body", "chunks": [], "chars": 0}
+
+        self._buffer: List[str] = []
+        self._chunk_type = "text"
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag in ("br", "hr"):
+                self._flush()
+            return
+        self._stack.append(tag)
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+            return
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        if tag in BLOCK_TAGS:
+            self._flush()
+            self._chunk_type = _chunk_type(tag, self._stack)
+        if tag in ("main", "article") and self._primary_depth is None:
+            if self.primary is None or (tag == "main" and self.primary["tag"] == "article"):
+                self.primary = {"tag": tag, "chunks": [], "chars": 0}
+                self.primary_closed = False
+                self._primary_depth = len(self._stack)
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            return
+        # Pop implicitly closed elements as well (e.g. unclosed <li> or <p>)
+        while self._stack:
+            open_tag = self._stack.pop()
+            if open_tag in SKIPPED_TAGS:
+                self._skip_depth -= 1
+            if open_tag == "title" and self._title_parts is not None:
+                self.title = WHITESPACE.sub(" ", "".join(self._title_parts)).strip()
+                self._title_parts = None
+            if open_tag in BLOCK_TAGS:
+                self._flush()
+                self._chunk_type = "text"
+            if self._primary_depth is not None and len(self._stack) < self._primary_depth:
+                self._primary_depth = None
+                self.primary_closed = True
+                if self.primary["tag"] == "main":
+                    raise _StopParsing()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+            return
+        if self._skip_depth:
+            return
+        self._buffer.append(data)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        raw = "".join(self._buffer)
+        self._buffer = []
+        text = raw.strip() if self._chunk_type == "code" else WHITESPACE.sub(" ", raw).strip()
+        if not text:
+            return
+        targets = [self.body]
+        if self._primary_depth is not None:
+            targets.append(self.primary)
+        for target in targets:
+            if target["chars"] >= self.max_chars:
+                continue
+            text_part = text[:self.max_chars - target["chars"]]
+            target["chunks"].append({"type": self._chunk_type, "text": text_part})
+            target["chars"] += len(text_part)
+        if self._primary_depth is not None and self.primary["chars"] >= self.max_chars:
+            raise _StopParsing()
+
+
+def _chunk_type(tag: str, stack: List[str]) -> str:
+    if tag in HEADING_TAGS:
+        return "heading"
+    if tag == "pre" or "pre" in stack:
+        return "code"
+    if tag == "li":
+        return "list_item"
+    if tag in ("td", "th", "tr"):
+        return "table"
+    return "text"
+
+
+def extract_html(html: str, max_chars: int = 50000) -> Dict[str, Any]:
+    """Extract the title and the primary text of a page as typed chunks.
+
+    Parsing stops at the end of <main>, or at the end of an <article> when no
+    <main> follows, or once max_chars of primary text have been collected.
+    """
+    parser = _ContentParser(max_chars)
+    stopped_early = False
+    main_follows = None
+    try:
+        for start in range(0, len(html), FEED_SIZE):
+            parser.feed(html[start:start + FEED_SIZE])
+            if parser.primary_closed and main_follows is None:
+                # A closed <article> is final unless a <main> still follows
+                main_follows = re.search("<main", html[start + FEED_SIZE:], re.IGNORECASE) is not None
+                if not main_follows:
+                    stopped_early = start + FEED_SIZE < len(html)
+                    break
+        else:
+            parser.close()
+            parser._flush()
+    except _StopParsing:
+        stopped_early = True
+
+    source = parser.primary if parser.primary and parser.primary["chunks"] else parser.body
+    chunks = source["chunks"]
+    return {
+        "title": parser.title or "",
+        "content": "\n\n".join(chunk["text"] for chunk in chunks),
+        "chunks": chunks,
+        "metadata": {
+            "source_element": source["tag"],
+            "truncated_text": source["chars"] >= max_chars,
+            "stopped_early": stopped_early
+        }
+    }
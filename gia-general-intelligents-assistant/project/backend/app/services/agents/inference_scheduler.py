@@ -0,0 +1,372 @@
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
+import asyncio
+import queue
+import threading
+import time
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from loguru import logger
+from ..deadline import DeadlineExceeded
+from ..metrics import metrics
+from .prefix_cache import PrefixKVCache
+
+_STOP = object()
+
+llm_tokens = metrics.counter("gia_llm_tokens_total", "Tokens processed by the LLM", ("kind",))
+llm_queue_wait = metrics.histogram(
+    "gia_llm_queue_wait_seconds", "Time a prompt waited before its batch started generating"
+)
+llm_generation_seconds = metrics.histogram(
+    "gia_llm_generation_seconds", "Duration of generate() calls, per batch"
+)
+llm_tokens_per_second = metrics.histogram(
+    "gia_llm_tokens_per_second",
+    "Completion tokens generated per second, per batch",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+)
+llm_batch_size = metrics.histogram(
+    "gia_llm_batch_size", "Prompts generated together in one batch", buckets=(1, 2, 4, 8, 16, 32)
+)
+
+
+class TokenStreamer:
+    """transformers streamer that forwards decoded text increments to a callback"""
+
+    def __init__(self, tokenizer, on_text: Callable[[str], None]):
+        self.tokenizer = tokenizer
+        self.on_text = on_text
+        self.tokens: List[int] = []
+        self.text = ""
+        self._prompt_skipped = False
+
+    def put(self, value):
+        # generate() first passes the prompt ids, then one new token per step
+        if not self._prompt_skipped:
+            self._prompt_skipped = True
+            return
+        self.add(value.flatten().tolist())
+
+    def add(self, tokens: List[int]):
+        self.tokens.extend(tokens)
+        text = self.tokenizer.decode(self.tokens, skip_special_tokens=True)
+        # Hold back partial multi-byte characters until the next token completes them
+        if text.endswith("\ufffd"):
+            return
+        self._emit(text)
+
+    def end(self):
+        self._emit(self.tokenizer.decode(self.tokens, skip_special_tokens=True))
+
+    def _emit(self, text: str):
+        if len(text) > len(self.text):
+            delta = text[len(self.text):]
+            self.text = text
+            self.on_text(delta)
+
+
+class BatchStreamer:
+    """Streamer for a batched generate(): routes each sequence's new tokens to the
+    TokenStreamer of its request, so streamed and plain requests can share a batch"""
+
+    def __init__(self, streamers: List[Optional[TokenStreamer]], pad_token_id: Optional[int]):
+        self.streamers = streamers
+        self.pad_token_id = pad_token_id
+        self._prompt_skipped = False
+
+    def put(self, value):
+        if not self._prompt_skipped:
+            self._prompt_skipped = True
+            return
+        # One new token per sequence; sequences that already stopped get padding
+        for streamer, tokens in zip(self.streamers, value.reshape(len(self.streamers), -1).tolist()):
+            tokens = [token for token in tokens if token != self.pad_token_id]
+            if streamer is not None and tokens:
+                streamer.add(tokens)
+
+    def end(self):
+        for streamer in self.streamers:
+            if streamer is not None:
+                streamer.end()
+
+
+class GenerationRequest:
+    __slots__ = ("prompt", "params", "future", "loop", "enqueued_at", "streamer", "deadline")
+
+    def __init__(
+        self,
+        prompt: str,
+        params: Dict[str, Any],
+        future: asyncio.Future,
+        loop: asyncio.AbstractEventLoop,
+        streamer: Optional[TokenStreamer] = None,
+        deadline: Optional[float] = None
+    ):
+        self.prompt = prompt
+        self.params = params
+        self.future = future
+        self.loop = loop
+        self.enqueued_at = time.perf_counter()
+        self.streamer = streamer
+        self.deadline = deadline
+
+    def expired(self, now: float) -> bool:
+        return self.deadline is not None and now >= self.deadline
+
+    def abandoned(self, now: float) -> bool:
+        """The caller stopped waiting (cancelled) or its deadline has passed"""
+        return self.future.cancelled() or self.expired(now)
+
+    @property
+    def batch_key(self) -> Tuple:
+        # Requests with identical sampling parameters batch, streamed or not
+        return tuple(sorted(self.params.items()))
+
+
+class StopAbandoned(StoppingCriteria):
+    """Stops each sequence of a batch as soon as its request is cancelled or out of time"""
+
+    def __init__(self, requests: List[GenerationRequest]):
+        self.requests = requests
+
+    def __call__(self, input_ids, scores, **kwargs):
+        now = time.monotonic()
+        return torch.tensor(
+            [request.abandoned(now) for request in self.requests],
+            dtype=torch.bool,
+            device=input_ids.device
+        )
+
+
+class InferenceScheduler:
+    """Collects prompts from concurrent callers and generates them in padded batches on a worker thread"""
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        device: str = "cpu",
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        prefix_cache: Optional[PrefixKVCache] = None
+    ):
+        self.model = model
+        self.prefix_cache = prefix_cache
+        self.tokenizer = tokenizer
+        self.device = device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = {
+            "requests": 0, "batches": 0, "batched_requests": 0, "abandoned": 0,
+            "completion_tokens": 0, "generation_seconds": 0.0
+        }
+
+        # Decoder-only models need left padding so every prompt ends right before the new tokens
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="llm-inference", daemon=True)
+        self._worker.start()
+
+    async def generate(self, prompt: str, deadline: Optional[float] = None, **params) -> str:
+        """Queue a prompt and wait for its completion text.
+
+        Generation stops early, freeing the batch slot, when the caller is cancelled or
+        the deadline (a time.monotonic() value) passes; the latter raises DeadlineExceeded.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put(GenerationRequest(prompt, params, future, loop, deadline=deadline))
+        self.stats["requests"] += 1
+        return await future
+
+    async def stream(self, prompt: str, deadline: Optional[float] = None, **params) -> AsyncIterator[str]:
+        """Queue a prompt and yield its completion text incrementally as tokens are generated"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        chunks: asyncio.Queue = asyncio.Queue()
+        streamer = TokenStreamer(self.tokenizer, lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text))
+        self._queue.put(GenerationRequest(prompt, params, future, loop, streamer, deadline))
+        self.stats["requests"] += 1
+
+        try:
+            while not future.done():
+                next_chunk = asyncio.ensure_future(chunks.get())
+                await asyncio.wait({next_chunk, future}, return_when=asyncio.FIRST_COMPLETED)
+                if next_chunk.done():
+                    yield next_chunk.result()
+                else:
+                    next_chunk.cancel()
+            # Chunks are scheduled on the loop before the result, so they are all queued by now
+            while not chunks.empty():
+                yield chunks.get_nowait()
+            future.result()
+        finally:
+            if not future.done():
+                future.cancel()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._worker.join(timeout=5)
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            groups: Dict[Tuple, List[GenerationRequest]] = {}
+            for request in batch:
+                groups.setdefault(request.batch_key, []).append(request)
+            for requests in groups.values():
+                self._generate_batch(requests)
+
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                self._resolve(item, error=RuntimeError("Inference scheduler stopped"))
+
+    def _collect_batch(self) -> Optional[List[GenerationRequest]]:
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+
+        # Keep accepting prompts until the batch is full or the wait window closes
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+
+        now = time.monotonic()
+        runnable = []
+        for request in batch:
+            if request.abandoned(now):
+                self.stats["abandoned"] += 1
+                if request.expired(now):
+                    self._resolve(request, error=DeadlineExceeded("Generation deadline exceeded before it started"))
+            else:
+                runnable.append(request)
+        return runnable
+
+    def _generate_batch(self, requests: List[GenerationRequest]):
+        if len(requests) == 1 and self.prefix_cache is not None:
+            return self._generate_with_prefix(requests[0])
+        try:
+            inputs = self.tokenizer(
+                [request.prompt for request in requests],
+                return_tensors="pt",
+                padding=True
+            ).to(self.device)
+            streamers = [request.streamer for request in requests]
+            streamer = (
+                {"streamer": BatchStreamer(streamers, self.tokenizer.pad_token_id)}
+                if any(streamers) else {}
+            )
+            started = self._started(requests)
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    **inputs,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    stopping_criteria=StoppingCriteriaList([StopAbandoned(requests)]),
+                    **streamer,
+                    **requests[0].params
+                )
+            prompt_length = inputs["input_ids"].shape[1]
+            self._record(started, int(inputs["attention_mask"].sum()), outputs[:, prompt_length:], len(requests))
+            texts = self.tokenizer.batch_decode(outputs[:, prompt_length:], skip_special_tokens=True)
+        except Exception as e:
+            logger.error(f"Batched generation failed for {len(requests)} prompts: {str(e)}")
+            for request in requests:
+                self._resolve(request, error=e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += len(requests)
+        for request, text in zip(requests, texts):
+            self._finish(request, text)
+
+    def _generate_with_prefix(self, request: GenerationRequest):
+        # Left padding shifts cached prefixes out of position, so prefix reuse is limited to single prompts
+        try:
+            input_ids = self.tokenizer(request.prompt, return_tensors="pt")["input_ids"]
+            prefix_length, past_key_values = self.prefix_cache.acquire(tuple(input_ids[0].tolist()))
+            input_ids = input_ids.to(self.device)
+            kwargs = {"past_key_values": past_key_values} if past_key_values is not None else {}
+            if request.streamer is not None:
+                kwargs["streamer"] = request.streamer
+            started = self._started([request])
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    stopping_criteria=StoppingCriteriaList([StopAbandoned([request])]),
+                    **kwargs,
+                    **request.params
+                )
+            self._record(started, input_ids.shape[1], outputs[:, input_ids.shape[1]:], 1)
+            text = self.tokenizer.decode(outputs[0, input_ids.shape[1]:], skip_special_tokens=True)
+        except Exception as e:
+            logger.error(f"Generation failed: {str(e)}")
+            self._resolve(request, error=e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["batched_requests"] += 1
+        self._finish(request, text)
+
+    @staticmethod
+    def _started(requests: List[GenerationRequest]) -> float:
+        now = time.perf_counter()
+        for request in requests:
+            llm_queue_wait.observe(now - request.enqueued_at)
+        return now
+
+    def _record(self, started: float, prompt_tokens: int, completions, batch_size: int):
+        elapsed = time.perf_counter() - started
+        # Padding after a sequence that stopped early is not generated output
+        completion_tokens = int((completions != self.tokenizer.pad_token_id).sum())
+        llm_tokens.inc(prompt_tokens, kind="prompt")
+        llm_tokens.inc(completion_tokens, kind="completion")
+        self.stats["completion_tokens"] += completion_tokens
+        self.stats["generation_seconds"] += elapsed
+        llm_generation_seconds.observe(elapsed)
+        llm_batch_size.observe(batch_size)
+        if elapsed > 0:
+            llm_tokens_per_second.observe(completion_tokens / elapsed)
+
+    def _finish(self, request: GenerationRequest, text: str):
+        now = time.monotonic()
+        if request.abandoned(now):
+            # Stopped early: a cancelled caller is gone, a late one gets an error, not a cut-off text
+            self.stats["abandoned"] += 1
+            if request.expired(now):
+                self._resolve(request, error=DeadlineExceeded("Generation deadline exceeded"))
+            return
+        self._resolve(request, result=text.strip())
+
+    @staticmethod
+    def _resolve(request: GenerationRequest, result: Any = None, error: Optional[BaseException] = None):
+        def complete():
+            if request.future.done():
+                return
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+        try:
+            request.loop.call_soon_threadsafe(complete)
+        except RuntimeError:
+            # The caller's event loop has already been closed
+            pass
@@ -1,52 +1,113 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Callable, Optional, Tuple
+import os
+import threading
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoTokenizer
 from loguru import logger
 from .base_agent import BaseAgent
+from .inference_scheduler import InferenceScheduler
+from .model_loader import configure_threads, load_model, unload_model
+from .prefix_cache import PrefixKVCache
+from .. import deadline as deadlines
+from ..cache import TTLCache
+
+DEFAULT_MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
 
 class LLMAgent(BaseAgent):
+    supports_streaming = True
+
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
-        self.model_name = "mistralai/Mistral-7B-Instruct-v0.2"
+        self.model_name = self.config.get("model_name", os.getenv("LLM_MODEL", DEFAULT_MODEL))
+        # A local checkpoint directory is loaded instead of downloading model_name
+        self.model_path = self.config.get("model_path", os.getenv("LLM_MODEL_PATH"))
+        self.cache_dir = self.config.get("cache_dir", os.getenv("MODEL_PATH"))
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        logger.info(f"Initializing LLM Agent with device: {self.device}")
-        
+        self.load_mode = self.config.get("load_mode", os.getenv("LLM_LOAD_MODE", "auto"))
+        self.mmap = self.config.get("mmap", os.getenv("LLM_MMAP", "false").lower() in ("1", "true", "yes"))
+        self.generation_params = {
+            "max_new_tokens": self.config.get("max_new_tokens", 512),
+            "temperature": self.config.get("temperature", 0.7),
+            "top_p": self.config.get("top_p", 0.95),
+            "do_sample": self.config.get("do_sample", True)
+        }
+        self.deterministic = not self.generation_params["do_sample"]
+        # Exact-match responses are only reusable when generation is deterministic
+        self.response_cache = TTLCache(
+            max_size=self.config.get("response_cache_size", 256),
+            ttl=self.config.get("response_cache_ttl", 3600),
+            name="llm_response"
+        ) if not self.generation_params["do_sample"] else None
+        self._counting_tokenizer = None
+        self._counting_lock = threading.Lock()
+        logger.info(f"Initializing LLM Agent with device: {self.device}, load mode: {self.load_mode}")
+
+        configure_threads(
+            self.config.get("torch_threads", _env_int("LLM_TORCH_THREADS")),
+            self.config.get("torch_interop_threads", _env_int("LLM_INTEROP_THREADS"))
+        )
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                device_map="auto"
+            self.tokenizer, self.model, self.load_stats = load_model(
+                self.model_source, self.device, self.load_mode, self.mmap, self.cache_dir
             )
             logger.info("LLM model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading LLM model: {str(e)}")
             raise
 
-    async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
+        # Prompts from concurrent tasks are batched and generated off the event loop
+        self.scheduler = InferenceScheduler(
+            self.model,
+            self.tokenizer,
+            device=self.device,
+            max_batch_size=self.config.get("max_batch_size", 8),
+            max_wait_ms=self.config.get("max_batch_wait_ms", 20),
+            prefix_cache=PrefixKVCache(
+                self.model,
+                device=self.device,
+                max_entries=self.config.get("prefix_cache_entries", 16),
+                min_prefix_tokens=self.config.get("prefix_cache_min_tokens", 16)
+            ) if self.config.get("prefix_cache", True) else None
+        )
+
+    @property
+    def model_source(self) -> str:
+        return self.model_path or self.model_name
+
+    async def execute(
+        self,
+        task_input: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         try:
             prompt = task_input.get("prompt", "")
             if not prompt:
                 return {"status": "error", "error": "No prompt provided"}
 
-            # Format the prompt for instruction-based model
-            formatted_prompt = f"""<s>[INST] {prompt} [/INST]"""
-
-            # Generate response
-            inputs = self.tokenizer(formatted_prompt, return_tensors="pt").to(self.device)
-            outputs = self.model.generate(
-                inputs["input_ids"],
-                max_new_tokens=512,
-                temperature=0.7,
-                top_p=0.95,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
-
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
-            # Extract the response after the instruction
-            response = response.split("[/INST]")[-1].strip()
+            if on_token is not None:
+                chunks = []
+                async for chunk in self.stream(task_input):
+                    chunks.append(chunk)
+                    on_token(chunk)
+                response = "".join(chunks).strip()
+            else:
+                formatted_prompt = self._format_prompt(prompt)
+                cache_key = self._cache_key(formatted_prompt)
+                response = self.response_cache.get(cache_key) if self.response_cache else None
+                if response is None:
+                    response = await self.scheduler.generate(
+                        formatted_prompt,
+                        deadline=deadlines.current(),
+                        **self.generation_params
+                    )
+                    if self.response_cache:
+                        self.response_cache.set(cache_key, response)
 
             return {
                 "status": "success",
@@ -62,9 +123,66 @@ class LLMAgent(BaseAgent):
                 "error": str(e)
             }
 
+    async def stream(self, task_input: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yield the response text incrementally as the model generates it"""
+        formatted_prompt = self._format_prompt(task_input.get("prompt", ""))
+        cache_key = self._cache_key(formatted_prompt)
+        cached = self.response_cache.get(cache_key) if self.response_cache else None
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        async for chunk in self.scheduler.stream(
+            formatted_prompt,
+            deadline=deadlines.current(),
+            **self.generation_params
+        ):
+            chunks.append(chunk)
+            yield chunk
+        if self.response_cache:
+            self.response_cache.set(cache_key, "".join(chunks).strip())
+
+    def _format_prompt(self, prompt: str) -> str:
+        # Format the prompt for instruction-based model
+        return f"""<s>[INST] {prompt} [/INST]"""
+
+    def count_tokens(self, text: str) -> int:
+        # Counted with a tokenizer of its own: the shared one is in use by the inference thread
+        with self._counting_lock:
+            if self._counting_tokenizer is None:
+                self._counting_tokenizer = AutoTokenizer.from_pretrained(
+                    self.model_source, cache_dir=self.cache_dir
+                )
+            return len(self._counting_tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _cache_key(self, formatted_prompt: str) -> Tuple:
+        return (self.model_name, formatted_prompt, tuple(sorted(self.generation_params.items())))
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["scheduler"] = dict(self.scheduler.stats)
+        status["model"] = dict(self.load_stats)
+        generation_seconds = self.scheduler.stats["generation_seconds"]
+        status["model"]["tokens_per_second"] = (
+            self.scheduler.stats["completion_tokens"] / generation_seconds if generation_seconds else None
+        )
+        status["response_cache"] = self.response_cache.stats() if self.response_cache else None
+        status["prefix_cache"] = (
+            self.scheduler.prefix_cache.get_stats() if self.scheduler.prefix_cache else None
+        )
+        return status
+
+    async def warmup(self):
+        """Run a one-token generation so kernels and caches are initialized before real traffic"""
+        await self.scheduler.generate("<s>[INST] Hello [/INST]", max_new_tokens=1, do_sample=False)
+
     async def cleanup(self):
         """Clean up GPU memory if needed"""
+        if hasattr(self, 'scheduler'):
+            self.scheduler.close()
         if hasattr(self, 'model'):
+            unload_model(self.model_source, self.device, self.load_mode, self.mmap)
             del self.model
         if hasattr(self, 'tokenizer'):
             del self.tokenizer
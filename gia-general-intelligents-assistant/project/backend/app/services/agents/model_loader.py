@@ -0,0 +1,224 @@
+"""Loading causal language models in different precision and memory modes.
+
+Modes:
+    auto      float16 on CUDA, float32 on CPU
+    float32 / bfloat16 / float16
+              weights in that dtype (bfloat16 halves CPU memory at little quality cost)
+    int8      CUDA: 8-bit weights through bitsandbytes; CPU: float32 weights with every
+              nn.Linear replaced by a dynamically quantized int8 one (about a quarter of
+              the float32 memory, faster matmuls on CPUs with VNNI/AVX-512)
+
+With mmap, weights are read straight from memory-mapped safetensors files instead of
+being copied into process memory: pages are loaded on first use and stay in the page
+cache, shared between processes on the same machine. This only avoids the copy when
+the mode keeps the checkpoint's dtype.
+
+A mode the device cannot run falls back to the nearest one that it can: int8 to auto
+without a quantized CPU engine or, on CUDA, without bitsandbytes; bfloat16 to float16
+on GPUs without bfloat16 support.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import glob
+import importlib.util
+import json
+import os
+import struct
+import threading
+import time
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
+from loguru import logger
+from .registry import resident_memory
+
+LOAD_MODES = ("auto", "float32", "bfloat16", "float16", "int8")
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+_models: Dict[Tuple, Tuple[Any, Any, Dict[str, Any]]] = {}
+_models_lock = threading.Lock()
+_threads_configured = False
+
+
+def configure_threads(threads: Optional[int] = None, interop_threads: Optional[int] = None):
+    """Set torch's intra-op and inter-op thread pools (once per process)"""
+    global _threads_configured
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads and not _threads_configured:
+        try:
+            # Only allowed before torch has run any parallel work in this process
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch inter-op threads: {str(e)}")
+    _threads_configured = True
+
+
+def resolve_mode(mode: Optional[str], device: str) -> str:
+    """The load mode to use for `mode` on `device`, normalized and with unsupported modes replaced"""
+    mode = (mode or "auto").strip().lower()
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode: {mode} (expected one of {', '.join(LOAD_MODES)})")
+    fallback = None
+    if mode == "int8" and not _int8_supported(device):
+        fallback = "auto"
+    elif mode == "bfloat16" and device == "cuda" and not torch.cuda.is_bf16_supported():
+        fallback = "float16"
+    if fallback is not None:
+        logger.warning(f"Load mode {mode} is not supported on {device} here, using {fallback}")
+        return fallback
+    return mode
+
+
+def _int8_supported(device: str) -> bool:
+    if device == "cuda":
+        return importlib.util.find_spec("bitsandbytes") is not None
+    return any(engine != "none" for engine in torch.backends.quantized.supported_engines)
+
+
+def weights_dtype(mode: str, device: str) -> torch.dtype:
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode: {mode} (expected one of {', '.join(LOAD_MODES)})")
+    if mode == "auto":
+        return torch.float16 if device == "cuda" else torch.float32
+    if mode == "int8":
+        # Dynamic quantization starts from float32 weights
+        return torch.float32
+    return getattr(torch, mode)
+
+
+def load_model(
+    source: str,
+    device: str,
+    mode: str = "auto",
+    mmap: bool = False,
+    cache_dir: Optional[str] = None
+) -> Tuple[Any, Any, Dict[str, Any]]:
+    """Load a tokenizer and model once per process and share them between agents.
+
+    `source` is a Hugging Face model name or a local checkpoint directory. Returns the
+    tokenizer, the model and load statistics (time, resident memory added, mode).
+    """
+    key = (source, device, mode, mmap)
+    with _models_lock:
+        if key not in _models:
+            mode = resolve_mode(mode, device)
+            memory_before = resident_memory()
+            started = time.perf_counter()
+            dtype = weights_dtype(mode, device)
+            tokenizer = AutoTokenizer.from_pretrained(source, cache_dir=cache_dir)
+            if mmap and device == "cpu":
+                model = _load_mmapped(source, dtype, cache_dir)
+            else:
+                model = _load_pretrained(source, device, mode, dtype, cache_dir)
+            if mode == "int8" and device == "cpu":
+                model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            model.eval()
+
+            stats = {
+                "source": source,
+                "device": device,
+                "mode": mode,
+                "dtype": str(dtype).replace("torch.", "") if mode != "int8" else "qint8",
+                "mmap": mmap and device == "cpu",
+                "load_time": time.perf_counter() - started,
+                "memory_bytes": max(resident_memory() - memory_before, 0),
+                "threads": torch.get_num_threads(),
+                "interop_threads": torch.get_num_interop_threads()
+            }
+            logger.info(
+                f"Loaded {source} ({stats['dtype']}{', mmap' if stats['mmap'] else ''}) on {device} "
+                f"in {stats['load_time']:.1f}s, +{stats['memory_bytes'] / 2**30:.2f} GiB RSS"
+            )
+            _models[key] = (tokenizer, model, stats)
+        return _models[key]
+
+
+def unload_model(source: str, device: str, mode: str = "auto", mmap: bool = False):
+    with _models_lock:
+        _models.pop((source, device, mode, mmap), None)
+
+
+def _load_pretrained(source: str, device: str, mode: str, dtype: torch.dtype, cache_dir: Optional[str]):
+    kwargs: Dict[str, Any] = {"cache_dir": cache_dir, "low_cpu_mem_usage": True}
+    if device == "cuda":
+        kwargs["device_map"] = "auto"
+        if mode == "int8":
+            from transformers import BitsAndBytesConfig
+            kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True)
+        else:
+            kwargs["torch_dtype"] = dtype
+    else:
+        kwargs["torch_dtype"] = dtype
+    return AutoModelForCausalLM.from_pretrained(source, **kwargs)
+
+
+def _load_mmapped(source: str, dtype: torch.dtype, cache_dir: Optional[str]):
+    from accelerate import init_empty_weights
+
+    files = _safetensors_files(source, cache_dir)
+    config = AutoConfig.from_pretrained(source, cache_dir=cache_dir)
+    # Parameters start on the meta device (no memory); buffers are created normally
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype)
+
+    state: Dict[str, torch.Tensor] = {}
+    converted = 0
+    for path in files:
+        for name, tensor in mmap_safetensors(path).items():
+            if tensor.is_floating_point() and tensor.dtype != dtype:
+                tensor = tensor.to(dtype)
+                converted += 1
+            state[name] = tensor
+    if converted:
+        logger.warning(f"{converted} tensors of {source} were converted to {dtype}, so they are copied, not mapped")
+
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.device.type == "meta"]
+    if missing:
+        raise ValueError(f"Checkpoint {source} has no weights for: {', '.join(missing[:5])}")
+    return model
+
+
+def _safetensors_files(source: str, cache_dir: Optional[str]) -> List[str]:
+    directory = source
+    if not os.path.isdir(directory):
+        from huggingface_hub import snapshot_download
+        directory = snapshot_download(source, cache_dir=cache_dir, allow_patterns=["*.json", "*.safetensors"])
+    files = sorted(glob.glob(os.path.join(directory, "*.safetensors")))
+    if not files:
+        raise ValueError(f"mmap loading needs safetensors weights, none found for {source}")
+    return files
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """Tensors of a safetensors file backed by a private (copy-on-write) memory map"""
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, _ = info["data_offsets"]
+        element_size = torch.empty((), dtype=dtype).element_size()
+        # The format aligns tensor data, so offsets are whole elements
+        tensor = torch.empty((), dtype=dtype)
+        tensor.set_(storage, (data_start + begin) // element_size, tuple(info["shape"]))
+        tensors[name] = tensor
+    return tensors
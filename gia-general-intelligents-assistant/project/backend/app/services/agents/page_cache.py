@@ -0,0 +1,152 @@
+from typing import Dict, Any, Optional
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from loguru import logger
+from ..metrics import cache_lookups
+
+MAX_AGE_PATTERN = re.compile(r"max-age\s*=\s*(\d+)", re.IGNORECASE)
+
+
+def freshness_lifetime(headers: Dict[str, str]) -> Optional[float]:
+    """Seconds a response may be served without revalidation, or None if it must not be stored"""
+    cache_control = next((v for k, v in headers.items() if k.lower() == "cache-control"), "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    match = MAX_AGE_PATTERN.search(cache_control)
+    return float(match.group(1)) if match else 0.0
+
+
+class PageCache:
+    """On-disk cache of fetched pages in SQLite.
+
+    Stores the compressed body, its validators (ETag / Last-Modified) and the extracted
+    result, so a fresh hit or a 304 revalidation skips both the download and the parse.
+    Least recently used pages are evicted once the stored size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                extracted TEXT,
+                size INTEGER,
+                fetched_at REAL,
+                expires_at REAL,
+                last_access REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_pages_last_access ON pages (last_access)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, status, headers, extracted, expires_at FROM pages WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                cache_lookups.inc(cache="page", result="miss")
+                return None
+            now = time.time()
+            self._db.execute("UPDATE pages SET last_access = ? WHERE url = ?", (now, url))
+
+        fresh = row[5] > now
+        self.stats["hits" if fresh else "stale"] += 1
+        cache_lookups.inc(cache="page", result="hit" if fresh else "stale")
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "status": row[2],
+            "headers": json.loads(row[3]),
+            "extracted": json.loads(row[4]),
+            "fresh": fresh
+        }
+
+    def body(self, url: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT body FROM pages WHERE url = ?", (url,)).fetchone()
+        return zlib.decompress(row[0]).decode(errors="replace") if row else None
+
+    def put(self, url: str, status: int, headers: Dict[str, str], body: str, extracted: Dict[str, Any]):
+        lifetime = freshness_lifetime(headers)
+        if lifetime is None:
+            return
+        header = {k.lower(): v for k, v in headers.items()}
+        compressed = zlib.compress(body.encode(), 6)
+        extracted_json = json.dumps(extracted)
+        size = len(compressed) + len(extracted_json)
+        now = time.time()
+
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url, header.get("etag"), header.get("last-modified"), status, json.dumps(headers),
+                    compressed, extracted_json, size, now, now + lifetime, now
+                )
+            )
+            self._size += size - (previous[0] if previous else 0)
+            self.stats["stores"] += 1
+            self._evict()
+
+    def refresh(self, url: str, headers: Dict[str, str]):
+        """Record a 304 revalidation: extend the entry's freshness from the new headers"""
+        self.stats["revalidated"] += 1
+        lifetime = freshness_lifetime(headers)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE pages SET expires_at = ?, last_access = ? WHERE url = ?",
+                (now + (lifetime or 0.0), now, url)
+            )
+
+    def _evict(self):
+        if self._size <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT url, size FROM pages ORDER BY last_access").fetchall()
+        evicted = []
+        for url, size in rows:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            evicted.append((url,))
+            self._size -= size
+        self._db.executemany("DELETE FROM pages WHERE url = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+        logger.info(f"Evicted {len(evicted)} pages from the page cache")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["stale"] + self.stats["misses"]
+        served = self.stats["hits"] + self.stats["revalidated"]
+        return {
+            **self.stats,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hit_ratio": served / lookups if lookups else 0.0
+        }
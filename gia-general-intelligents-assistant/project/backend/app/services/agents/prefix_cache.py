@@ -0,0 +1,96 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import OrderedDict, deque
+import copy
+import threading
+import torch
+from ..metrics import cache_lookups
+
+
+def _common_prefix_length(a: Tuple[int, ...], b: Tuple[int, ...]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class PrefixKVCache:
+    """Stores key/value caches for prompt prefixes that recur across calls.
+
+    Prefixes are learned from traffic: when a prompt shares at least min_prefix_tokens
+    leading tokens with a recently seen prompt (the [INST] wrapper plus a fixed
+    instruction header), that prefix is encoded once and reused by later prompts.
+    """
+
+    def __init__(
+        self,
+        model,
+        device: str = "cpu",
+        max_entries: int = 16,
+        min_prefix_tokens: int = 16,
+        history_size: int = 64
+    ):
+        self.model = model
+        self.device = device
+        self.max_entries = max_entries
+        self.min_prefix_tokens = min_prefix_tokens
+        self._entries: "OrderedDict[Tuple[int, ...], Any]" = OrderedDict()
+        self._recent: "deque[Tuple[int, ...]]" = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0, "reused_tokens": 0}
+
+    def acquire(self, input_ids: Tuple[int, ...]) -> Tuple[int, Optional[Any]]:
+        """Return (prefix length, private copy of its KV cache) for the longest usable prefix"""
+        with self._lock:
+            # At least one prompt token must remain uncached for generate() to process
+            best = max(
+                (key for key in self._entries
+                 if len(key) < len(input_ids) and input_ids[:len(key)] == key),
+                key=len,
+                default=None
+            )
+            if best is not None:
+                self._entries.move_to_end(best)
+                self.stats["hits"] += 1
+                cache_lookups.inc(cache="llm_prefix", result="hit")
+                self.stats["reused_tokens"] += len(best)
+                return len(best), copy.deepcopy(self._entries[best])
+
+            self.stats["misses"] += 1
+            cache_lookups.inc(cache="llm_prefix", result="miss")
+            shared = max((_common_prefix_length(input_ids, seen) for seen in self._recent), default=0)
+            self._recent.append(input_ids)
+            shared = min(shared, len(input_ids) - 1)
+            if shared < self.min_prefix_tokens:
+                return 0, None
+
+        prefix = input_ids[:shared]
+        cache = self._encode(prefix)
+        with self._lock:
+            self._entries[prefix] = cache
+            self.stats["stored"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return shared, copy.deepcopy(cache)
+
+    def _encode(self, prefix: Tuple[int, ...]) -> Any:
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=torch.tensor([prefix], device=self.device),
+                use_cache=True
+            )
+        return outputs.past_key_values
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._recent.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0
+        }
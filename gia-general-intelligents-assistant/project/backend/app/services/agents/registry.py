@@ -0,0 +1,147 @@
+from typing import Dict, Any, Callable, Iterable, Optional
+import asyncio
+import os
+import resource
+import threading
+import time
+from loguru import logger
+from .base_agent import BaseAgent
+
+AgentFactory = Callable[[Dict[str, Any]], BaseAgent]
+
+
+def resident_memory() -> int:
+    """Current resident set size of the process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Peak RSS is the best portable approximation (reported in KiB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Agent modules are imported on first use so importing the API does not pull in torch or docker
+def _scraper_agent(config: Dict[str, Any]) -> BaseAgent:
+    from .scraper_agent import ScraperAgent
+    return ScraperAgent(config)
+
+
+def _github_agent(config: Dict[str, Any]) -> BaseAgent:
+    from .github_agent import GitHubAgent
+    return GitHubAgent(config)
+
+
+def _code_execution_agent(config: Dict[str, Any]) -> BaseAgent:
+    from .code_execution_agent import CodeExecutionAgent
+    return CodeExecutionAgent(config)
+
+
+def _llm_agent(config: Dict[str, Any]) -> BaseAgent:
+    from .llm_agent import LLMAgent
+    return LLMAgent(config)
+
+
+DEFAULT_FACTORIES: Dict[str, AgentFactory] = {
+    "scraper": _scraper_agent,
+    "github": _github_agent,
+    "code_execution": _code_execution_agent,
+    "llm": _llm_agent
+}
+
+
+class AgentRegistry:
+    """Process-wide set of agents, each created once on first use and shared by every engine"""
+
+    def __init__(
+        self,
+        factories: Optional[Dict[str, AgentFactory]] = None,
+        configs: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        self.factories = dict(factories or DEFAULT_FACTORIES)
+        self.configs = configs or {}
+        self._agents: Dict[str, BaseAgent] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, agent_type: str, factory: AgentFactory, config: Optional[Dict[str, Any]] = None):
+        """Add or replace an agent factory; an already created agent of that type is dropped"""
+        with self._registry_lock:
+            self.factories[agent_type] = factory
+            if config is not None:
+                self.configs[agent_type] = config
+            self._agents.pop(agent_type, None)
+            self._stats.pop(agent_type, None)
+
+    async def get(self, agent_type: str) -> BaseAgent:
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+        # Agent construction loads models and opens clients, so keep it off the event loop
+        return await asyncio.to_thread(self.get_sync, agent_type)
+
+    def get_sync(self, agent_type: str) -> BaseAgent:
+        agent = self._agents.get(agent_type)
+        if agent is not None:
+            return agent
+        if agent_type not in self.factories:
+            raise ValueError(f"Unknown agent type: {agent_type}")
+
+        with self._registry_lock:
+            lock = self._locks.setdefault(agent_type, threading.Lock())
+        with lock:
+            agent = self._agents.get(agent_type)
+            if agent is not None:
+                return agent
+
+            memory_before = resident_memory()
+            started = time.perf_counter()
+            agent = self.factories[agent_type](self.configs.get(agent_type, {}))
+            load_time = time.perf_counter() - started
+            memory = max(resident_memory() - memory_before, 0)
+
+            self._stats[agent_type] = {
+                "load_time": load_time,
+                "memory_bytes": memory,
+                "loaded_at": time.time(),
+                "warmed_up": False
+            }
+            self._agents[agent_type] = agent
+            logger.info(f"Loaded {agent_type} agent in {load_time:.2f}s (+{memory / 2**20:.1f} MiB RSS)")
+            return agent
+
+    async def warmup(self, agent_types: Optional[Iterable[str]] = None):
+        """Create the given agents (default: all) and run their warm-up hooks"""
+        for agent_type in agent_types or list(self.factories):
+            try:
+                agent = await self.get(agent_type)
+                started = time.perf_counter()
+                await agent.warmup()
+                self._stats[agent_type]["warmed_up"] = True
+                self._stats[agent_type]["warmup_time"] = time.perf_counter() - started
+            except Exception as e:
+                logger.error(f"Error warming up {agent_type} agent: {str(e)}")
+
+    def is_loaded(self, agent_type: str) -> bool:
+        return agent_type in self._agents
+
+    def status(self) -> Dict[str, Any]:
+        status = {}
+        for agent_type in self.factories:
+            agent = self._agents.get(agent_type)
+            status[agent_type] = {"loaded": agent is not None, **self._stats.get(agent_type, {})}
+            if agent is not None:
+                status[agent_type]["agent"] = agent.get_status()
+        return status
+
+    async def cleanup(self):
+        for agent_type, agent in list(self._agents.items()):
+            try:
+                await agent.cleanup()
+            except Exception as e:
+                logger.error(f"Error cleaning up {agent_type} agent: {str(e)}")
+        self._agents.clear()
+        self._stats.clear()
+
+
+agent_registry = AgentRegistry()
@@ -1,26 +1,79 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+import asyncio
+import multiprocessing
+import os
+import random
+import time
 import aiohttp
-from bs4 import BeautifulSoup
 from loguru import logger
 from .base_agent import BaseAgent
+from .html_extract import extract_html
+from .page_cache import PageCache
+from .. import deadline as deadlines
+from ..coalescing import CallCoalescer
+from ..metrics import metrics
+
+scrape_bytes = metrics.counter("gia_scrape_bytes_total", "Response body bytes downloaded by the scraper")
+scrape_seconds = metrics.histogram(
+    "gia_scrape_fetch_seconds", "Duration of page downloads by response status", ("status",)
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
 
 class ScraperAgent(BaseAgent):
+    def __init__(self, config: Dict[str, Any] = None):
+        super().__init__(config)
+        self.max_concurrency = self.config.get("max_concurrency", 10)
+        self.max_per_host = self.config.get("max_per_host", 2)
+        self.timeout = aiohttp.ClientTimeout(
+            total=self.config.get("request_timeout", 15),
+            connect=self.config.get("connect_timeout", 5)
+        )
+        self.retries = self.config.get("retries", 2)
+        self.backoff = self.config.get("backoff", 0.5)
+        self.max_bytes = self.config.get("max_bytes", 2 * 1024 * 1024)
+        self.max_text_chars = self.config.get("max_text_chars", 50000)
+        self.extract_workers = self.config.get("extract_workers", min(4, os.cpu_count() or 1))
+        # Below this size a page is cheaper to parse in a thread than to ship to another process
+        self.inline_extract_below = self.config.get("inline_extract_below", 32 * 1024)
+        self._extract_pool: Optional[ProcessPoolExecutor] = None
+
+        self.page_cache: Optional[PageCache] = None
+        if self.config.get("page_cache", True):
+            self.page_cache = PageCache(
+                self.config.get("page_cache_path", os.path.join(os.getenv("CACHE_DIR", "./cache"), "pages.db")),
+                max_bytes=self.config.get("page_cache_max_bytes", 256 * 1024 * 1024)
+            )
+
+        # Tasks scraping the same URL at the same time share one fetch
+        self._pages = CallCoalescer("scraper_page")
+
+        # Created on first use inside the event loop and shared by every task
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
     async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
         urls = task_input.get("urls", [])
         if not urls:
             urls = await self._extract_urls_from_task(task_input.get("description", ""))
-        
-        results = []
-        async with aiohttp.ClientSession() as session:
-            for url in urls:
-                try:
-                    result = await self._scrape_url(session, url)
-                    results.append({"url": url, "content": result, "status": "success"})
-                except Exception as e:
-                    logger.error(f"Error scraping {url}: {str(e)}")
-                    results.append({"url": url, "error": str(e), "status": "failed"})
-        
-        return {"results": results}
+
+        session = self._get_session()
+        results = await asyncio.gather(*(self._scrape(session, url) for url in urls))
+        return {"results": list(results)}
+
+    async def _scrape(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+        try:
+            result = await self._pages.run(url, lambda _: self._scrape_url(session, url))
+            return {"url": url, "content": result, "status": "success"}
+        except Exception as e:
+            logger.error(f"Error scraping {url}: {str(e)}")
+            return {"url": url, "error": str(e) or e.__class__.__name__, "status": "failed"}
 
     async def _extract_urls_from_task(self, description: str) -> List[str]:
         # Implement URL extraction from task description
@@ -29,21 +82,156 @@ class ScraperAgent(BaseAgent):
         urls = [word for word in words if word.startswith(("http://", "https://"))]
         return urls
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # Keep-alive connections are pooled by the connector across calls
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_concurrency,
+                    limit_per_host=self.max_per_host,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=30
+                ),
+                timeout=self.timeout
+            )
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._host_semaphores = {}
+        return self._session
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_semaphores[host]
+
+    async def _fetch(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[str, int, Dict[str, str], bool]:
+        """GET a page with retries; the body is read in chunks and cut off at max_bytes.
+
+        Each attempt's timeout is cut to the node's deadline, and no retry is started
+        that could not finish before it.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore, self._host_semaphore(url):
+                    timeout = aiohttp.ClientTimeout(
+                        total=deadlines.clamp(self.timeout.total),
+                        connect=self.timeout.connect
+                    )
+                    started = time.perf_counter()
+                    async with session.get(url, headers=headers, timeout=timeout) as response:
+                        if response.status in RETRY_STATUSES and attempt < self.retries:
+                            retry_after = response.headers.get("Retry-After", "")
+                            delay = float(retry_after) if retry_after.isdigit() else None
+                            raise _RetryableStatus(response.status, delay)
+
+                        body = bytearray()
+                        truncated = False
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            body.extend(chunk)
+                            if len(body) >= self.max_bytes:
+                                del body[self.max_bytes:]
+                                truncated = True
+                                break
+                        scrape_bytes.inc(len(body))
+                        scrape_seconds.observe(time.perf_counter() - started, status=response.status)
+                        html = bytes(body).decode(response.charset or "utf-8", errors="replace")
+                        return html, response.status, dict(response.headers), truncated
+            except (aiohttp.ClientError, asyncio.TimeoutError, _RetryableStatus) as e:
+                if attempt >= self.retries:
+                    raise
+                delay = getattr(e, "delay", None)
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt + random.uniform(0, self.backoff)
+                left = deadlines.remaining()
+                if left is not None and delay >= left:
+                    raise
+                logger.warning(f"Retrying {url} in {delay:.2f}s after {e.__class__.__name__}: {str(e)}")
+                attempt += 1
+                await asyncio.sleep(min(delay, 30))
+
     async def _scrape_url(self, session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
-        async with session.get(url) as response:
-            html = await response.text()
-            soup = BeautifulSoup(html, "html.parser")
-            
-            # Extract relevant information
-            title = soup.title.string if soup.title else ""
-            main_content = soup.find("main") or soup.find("article") or soup.find("body")
-            text_content = main_content.get_text(strip=True) if main_content else ""
-            
-            return {
-                "title": title,
-                "content": text_content,
-                "metadata": {
-                    "status_code": response.status,
-                    "headers": dict(response.headers)
-                }
-            }
\ No newline at end of file
+        cached = await asyncio.to_thread(self.page_cache.get, url) if self.page_cache else None
+        if cached is not None and cached["fresh"]:
+            return self._with_cache_state(cached["extracted"], "hit")
+
+        conditional = {}
+        if cached is not None:
+            if cached["etag"]:
+                conditional["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                conditional["If-Modified-Since"] = cached["last_modified"]
+
+        html, status, headers, truncated = await self._fetch(session, url, conditional or None)
+        if status == 304 and cached is not None:
+            await asyncio.to_thread(self.page_cache.refresh, url, headers)
+            return self._with_cache_state(cached["extracted"], "revalidated")
+
+        extracted = await self._extract(html)
+        result = {
+            "title": extracted["title"],
+            "content": extracted["content"],
+            "chunks": extracted["chunks"],
+            "metadata": {
+                "status_code": status,
+                "headers": headers,
+                "truncated": truncated,
+                **extracted["metadata"]
+            }
+        }
+        if self.page_cache and status == 200:
+            await asyncio.to_thread(self.page_cache.put, url, status, headers, html, result)
+        return self._with_cache_state(result, "miss")
+
+    @staticmethod
+    def _with_cache_state(result: Dict[str, Any], state: str) -> Dict[str, Any]:
+        return {**result, "metadata": {**result["metadata"], "cache": state}}
+
+    async def _extract(self, html: str) -> Dict[str, Any]:
+        """Parse a page off the event loop, in a worker process for anything but small pages"""
+        if len(html) < self.inline_extract_below or self.extract_workers < 1:
+            return await asyncio.to_thread(extract_html, html, self.max_text_chars)
+
+        if self._extract_pool is None:
+            # spawn keeps workers independent of the API process's threads and loaded models
+            self._extract_pool = ProcessPoolExecutor(
+                max_workers=self.extract_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._extract_pool, extract_html, html, self.max_text_chars)
+        except BrokenProcessPool:
+            logger.error("HTML extraction pool died; restarting it")
+            self._extract_pool = None
+            return await asyncio.to_thread(extract_html, html, self.max_text_chars)
+
+    async def cleanup(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._extract_pool is not None:
+            self._extract_pool.shutdown(wait=False, cancel_futures=True)
+            self._extract_pool = None
+        if self.page_cache is not None:
+            self.page_cache.close()
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status["page_cache"] = self.page_cache.get_stats() if self.page_cache else None
+        status["coalescing"] = self._pages.get_stats()
+        return status
+
+
+class _RetryableStatus(Exception):
+    def __init__(self, status: int, delay: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.delay = delay
@@ -0,0 +1,84 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+import asyncio
+from . import deadline as deadlines
+from .metrics import metrics
+
+TokenCallback = Callable[[str], None]
+# Starts the shared call; streaming calls pass their partial output to the given callback
+CallFactory = Callable[[TokenCallback], Awaitable[Any]]
+
+coalesced_calls = metrics.counter(
+    "gia_coalesced_calls_total", "Calls that joined an identical call already in flight", ("name",)
+)
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "listeners", "chunks")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.waiters = 0
+        self.listeners: List[TokenCallback] = []
+        self.chunks: List[str] = []
+
+    def emit(self, text: str):
+        self.chunks.append(text)
+        for listener in list(self.listeners):
+            listener(text)
+
+
+class CallCoalescer:
+    """Runs concurrent calls with the same key once and gives every caller the result.
+
+    The call runs as its own task, in the context of the caller that started it but
+    without its deadline: every caller waits for it only until its own deadline, so a
+    caller with an early deadline does not cut the call short for the others. A caller
+    that is cancelled or runs out of time stops waiting; the call itself is cancelled
+    when no caller is left. Streamed output reaches every caller, and one that joins
+    late first receives what was produced before it joined. Errors are shared like
+    results but not remembered: the next call after a failure runs again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stats = {"calls": 0, "coalesced": 0}
+        self._calls: Dict[Hashable, _Call] = {}
+
+    async def run(self, key: Hashable, factory: CallFactory, on_token: Optional[TokenCallback] = None) -> Any:
+        self.stats["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call()
+            # The task takes a copy of the context it is created in
+            call.task = deadlines.detached().run(asyncio.create_task, factory(call.emit))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._calls[key] = call
+        else:
+            self.stats["coalesced"] += 1
+            coalesced_calls.inc(name=self.name)
+            if on_token is not None:
+                for text in call.chunks:
+                    on_token(text)
+
+        call.waiters += 1
+        if on_token is not None:
+            call.listeners.append(on_token)
+        try:
+            # Unlike wait_for, wait leaves the shared task running when this caller stops waiting
+            done, _ = await asyncio.wait((call.task,), timeout=deadlines.remaining())
+        finally:
+            call.waiters -= 1
+            if on_token is not None:
+                call.listeners.remove(on_token)
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+        if not done:
+            raise deadlines.DeadlineExceeded("Deadline exceeded waiting for a shared call")
+        return call.task.result()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": len(self._calls)}
@@ -0,0 +1,59 @@
+"""Deadline of the workflow node being executed.
+
+The engine sets it around each agent call; agents read it to bound their own waits
+(HTTP timeouts, generation, container runs) so they give up cleanly before the node's
+budget runs out. It is a context variable, so it follows the node into tasks and
+threads started from it. Times are time.monotonic() values.
+"""
+from typing import Iterator, Optional
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+import time
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def current() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (never negative), or None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """Shorten a timeout so it ends by the current deadline; raises once the deadline has passed"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def detached() -> Context:
+    """A copy of the current context without a deadline, for work shared by callers
+    whose deadlines differ; each caller bounds its own wait instead"""
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
+
+
+@contextmanager
+def scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """Run a block with a deadline `seconds` from now, never later than an enclosing one"""
+    deadline = _deadline.get()
+    if seconds is not None:
+        candidate = time.monotonic() + seconds
+        deadline = candidate if deadline is None else min(deadline, candidate)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
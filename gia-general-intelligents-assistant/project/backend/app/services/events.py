@@ -0,0 +1,80 @@
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+from collections import deque
+import asyncio
+from .cache import TTLCache
+
+TERMINAL_EVENT = "end"
+
+
+class TaskEventBroker:
+    """In-process pub/sub of task progress events (step transitions, LLM tokens).
+
+    Events of running tasks are kept in a bounded history so late subscribers can catch
+    up; a finished task's history is retained briefly to cover the race between reading
+    its status from the database and subscribing.
+    """
+
+    def __init__(self, history_size: int = 2000, retention: float = 60):
+        self.history_size = history_size
+        self._history: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._running: Set[str] = set()
+        self._finished = TTLCache(max_size=1024, ttl=retention)
+
+    def open(self, task_id: str):
+        self._running.add(task_id)
+        self._history.setdefault(task_id, deque(maxlen=self.history_size))
+        self._finished.pop(task_id)
+
+    def publish(self, task_id: str, event: Dict[str, Any]):
+        history = self._history.get(task_id)
+        if history is None:
+            return
+        history.append(event)
+        for queue in self._subscribers.get(task_id, ()):
+            queue.put_nowait(event)
+
+    def close(self, task_id: str):
+        self.publish(task_id, {"type": TERMINAL_EVENT})
+        self._running.discard(task_id)
+        history = self._history.pop(task_id, None)
+        if history is not None:
+            self._finished.set(task_id, list(history))
+
+    def is_active(self, task_id: str) -> bool:
+        return task_id in self._running
+
+    async def subscribe(self, task_id: str, heartbeat: float = 15) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield a task's events until it finishes; None is yielded after `heartbeat` idle seconds"""
+        finished = self._finished.get(task_id)
+        if finished is not None:
+            for event in finished:
+                yield event
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        # Replay first, then register, with no await in between so nothing is missed or duplicated
+        for event in self._history.setdefault(task_id, deque(maxlen=self.history_size)):
+            queue.put_nowait(event)
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event.get("type") == TERMINAL_EVENT:
+                    return
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+                    if task_id not in self._running:
+                        self._history.pop(task_id, None)
+
+
+task_events = TaskEventBroker()
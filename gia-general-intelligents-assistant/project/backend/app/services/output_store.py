@@ -0,0 +1,85 @@
+"""Compressed storage of large step outputs.
+
+An output up to STEP_OUTPUT_INLINE_BYTES is kept whole in TaskStep.output. A larger
+one is gzip-compressed into the task_step_outputs table; the step row keeps only its
+first PREVIEW_CHARS characters and its size, so listing and reading tasks never loads
+it. The full output is read back for checkpoints and streamed by
+GET /tasks/{task_id}/steps/{step}/output.
+"""
+from typing import AsyncIterator, Dict, Iterable, Optional, Tuple
+import asyncio
+import os
+import zlib
+from sqlalchemy import delete, select
+from ..models.database import async_session
+from ..models.task import StepOutput
+
+ENCODING = "gzip"
+# zlib window bits selecting the gzip container, so stored bytes can be sent as-is
+GZIP_WBITS = 31
+PREVIEW_CHARS = 1024
+CHUNK_BYTES = 64 * 1024
+
+
+class OutputStore:
+    def __init__(self, session_factory=async_session, inline_bytes: Optional[int] = None, level: int = 6):
+        self.session_factory = session_factory
+        self.inline_bytes = inline_bytes if inline_bytes is not None else int(os.getenv("STEP_OUTPUT_INLINE_BYTES", "16384"))
+        self.level = level
+
+    async def pack(self, text: str) -> Tuple[str, int, Optional[Dict[str, object]]]:
+        """Split an output into what its step row keeps, its size in bytes, and the
+        StepOutput values to store (None when it fits in the row)"""
+        data = text.encode()
+        if len(data) <= self.inline_bytes:
+            return text, len(data), None
+        # Compressing megabytes of text is CPU work, keep it off the event loop
+        compressed = await asyncio.to_thread(self._compress, data)
+        return text[:PREVIEW_CHARS], len(data), {"encoding": ENCODING, "size": len(data), "data": compressed}
+
+    def _compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, GZIP_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    async def load(self, step_ids: Iterable[str]) -> Dict[str, str]:
+        """Full outputs of stored steps by step id"""
+        step_ids = list(step_ids)
+        if not step_ids:
+            return {}
+        async with self.session_factory() as session:
+            rows = (await session.execute(
+                select(StepOutput.step_id, StepOutput.data).where(StepOutput.step_id.in_(step_ids))
+            )).all()
+        return {
+            step_id: (await asyncio.to_thread(zlib.decompress, data, GZIP_WBITS)).decode()
+            for step_id, data in rows
+        }
+
+    async def read_compressed(self, step_id: str) -> Optional[bytes]:
+        async with self.session_factory() as session:
+            return (await session.execute(
+                select(StepOutput.data).where(StepOutput.step_id == step_id)
+            )).scalar_one_or_none()
+
+    @staticmethod
+    async def decompressed(data: bytes) -> AsyncIterator[bytes]:
+        """Yield the output in chunks of at most CHUNK_BYTES, decompressing as it is sent"""
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        pending = data
+        while pending:
+            chunk = decompressor.decompress(pending, CHUNK_BYTES)
+            pending = decompressor.unconsumed_tail
+            if chunk:
+                yield chunk
+        remainder = decompressor.flush()
+        if remainder:
+            yield remainder
+
+    @staticmethod
+    async def delete(session, step_ids: Iterable[str]):
+        step_ids = list(step_ids)
+        if step_ids:
+            await session.execute(delete(StepOutput).where(StepOutput.step_id.in_(step_ids)))
+
+
+output_store = OutputStore()
@@ -0,0 +1,208 @@
+"""Fit large node outputs into a prompt within a token budget.
+
+A value interpolated into a prompt (scraped pages, GitHub code samples, plain text) is
+split into passages: page chunks grouped under their headings, source files split at
+top-level definitions, text split at blank lines. Passages are ranked by BM25 against
+a query (usually the task description) and the best ones are kept until the budget,
+counted with the agent's tokenizer, is used up. Kept passages are emitted in their
+original order so code and prose stay readable.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from collections import Counter
+import json
+import math
+import re
+
+TokenCounter = Callable[[str], int]
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+CAMEL_PATTERN = re.compile(r"([a-z0-9])([A-Z])")
+DEFINITION_PATTERN = re.compile(r"^(?:async\s+def|def|class)\s", re.MULTILINE)
+
+PASSAGE_CHARS = 1200
+CODE_BLOCK_LINES = 60
+# A passage larger than the remaining budget is cut to fit when at least this many tokens are left
+MIN_PARTIAL_TOKENS = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for agents without a tokenizer"""
+    return (len(text) + 3) // 4
+
+
+class Passage:
+    __slots__ = ("source", "text", "index", "tokens")
+
+    def __init__(self, source: str, text: str, index: int):
+        self.source = source
+        self.text = text
+        self.index = index
+        self.tokens = 0
+
+
+def terms(text: str) -> List[str]:
+    """Lower-case word terms; identifiers are also split at underscores and camelCase"""
+    return TERM_PATTERN.findall(CAMEL_PATTERN.sub(r"\1 \2", text).lower())
+
+
+class BM25:
+    """Okapi BM25 over a small in-memory set of documents"""
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0.0
+        document_frequency: Counter = Counter()
+        for frequencies in self.frequencies:
+            document_frequency.update(frequencies.keys())
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()
+        }
+
+    def scores(self, query: Sequence[str]) -> List[float]:
+        query_terms = [term for term in set(query) if term in self.idf]
+        scores = []
+        for frequencies, length in zip(self.frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            scores.append(sum(
+                self.idf[term] * frequencies[term] * (self.k1 + 1) / (frequencies[term] + norm)
+                for term in query_terms if term in frequencies
+            ))
+        return scores
+
+
+def split_passages(value: Any, source: str = "") -> List[Tuple[str, str]]:
+    """(source, text) passages of a node output"""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [passage for item in value for passage in split_passages(item, source)]
+    if isinstance(value, dict):
+        if "code" in value and isinstance(value["code"], str):
+            name = "/".join(str(value[key]) for key in ("repository", "file_name") if value.get(key))
+            return [(name or source, block) for block in _code_blocks(value["code"])]
+        if isinstance(value.get("content"), dict):
+            # Scraper result: {"url", "content": extracted page}
+            return split_passages(value["content"], value.get("url") or source)
+        if isinstance(value.get("chunks"), list):
+            label = " - ".join(part for part in (value.get("title"), source) if part)
+            return [(label, text) for text in _page_passages(value["chunks"])]
+        if isinstance(value.get("content"), str):
+            return [(value.get("title") or value.get("url") or source, text) for text in _text_passages(value["content"])]
+        return [(source, json.dumps(value, default=str))]
+    return [(source, text) for text in _text_passages(str(value))]
+
+
+def _page_passages(chunks: List[Dict[str, Any]]) -> List[str]:
+    passages: List[str] = []
+    current: List[str] = []
+    size = 0
+    for chunk in chunks:
+        text = chunk.get("text", "")
+        if current and (chunk.get("type") == "heading" or size + len(text) > PASSAGE_CHARS):
+            passages.append("\n".join(current))
+            current, size = [], 0
+        current.append(text)
+        size += len(text)
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def _text_passages(text: str) -> List[str]:
+    passages: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(paragraph) > PASSAGE_CHARS:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        passages.append(current)
+    return passages
+
+
+def _code_blocks(code: str) -> List[str]:
+    starts = [0] + [match.start() for match in DEFINITION_PATTERN.finditer(code) if match.start() > 0]
+    blocks = []
+    for start, end in zip(starts, starts[1:] + [len(code)]):
+        lines = code[start:end].rstrip("\n").split("\n")
+        for offset in range(0, len(lines), CODE_BLOCK_LINES):
+            block = "\n".join(lines[offset:offset + CODE_BLOCK_LINES])
+            if block.strip():
+                blocks.append(block)
+    return blocks
+
+
+def fit(value: Any, query: str, budget: int, count_tokens: TokenCounter) -> Tuple[str, Dict[str, Any]]:
+    """Render `value` as text of at most `budget` tokens, keeping the passages most
+    relevant to `query`. Returns the text and a report of what was kept and dropped."""
+    passages = [Passage(source, text, index) for index, (source, text) in enumerate(split_passages(value))]
+    for passage in passages:
+        passage.tokens = count_tokens(passage.text)
+    # _render puts a [source] label before each source's passages; it counts against the budget
+    labels = {passage.source: count_tokens(f"[{passage.source}]") for passage in passages if passage.source}
+    total = sum(passage.tokens for passage in passages) + sum(labels.values())
+
+    if total <= budget:
+        kept = passages
+    else:
+        scores = BM25([terms(f"{p.source} {p.text}") for p in passages]).scores(terms(query))
+        ranked = sorted(passages, key=lambda p: (-scores[p.index], p.index))
+        kept, remaining, labelled = [], budget, set()
+        for passage in ranked:
+            label = 0 if passage.source in labelled else labels.get(passage.source, 0)
+            if passage.tokens + label <= remaining:
+                kept.append(passage)
+                remaining -= passage.tokens + label
+                labelled.add(passage.source)
+            elif remaining - label >= min(MIN_PARTIAL_TOKENS, budget):
+                partial = _truncate(passage, remaining - label, count_tokens)
+                if partial is not None:
+                    kept.append(partial)
+                    remaining -= partial.tokens + label
+                    labelled.add(passage.source)
+            if remaining <= 0:
+                break
+        kept.sort(key=lambda p: p.index)
+
+    text = _render(kept)
+    kept_tokens = sum(passage.tokens for passage in kept) + sum(
+        labels[source] for source in {passage.source for passage in kept if passage.source}
+    )
+    return text, {
+        "budget": budget,
+        "tokens": total,
+        "kept_tokens": kept_tokens,
+        "dropped_tokens": total - kept_tokens,
+        "passages": len(passages),
+        "kept_passages": len(kept)
+    }
+
+
+def _truncate(passage: Passage, tokens: int, count_tokens: TokenCounter) -> Optional[Passage]:
+    # Cut by the passage's own characters-per-token ratio, then shrink until it fits
+    length = int(len(passage.text) * tokens / passage.tokens)
+    for _ in range(4):
+        if length <= 0:
+            return None
+        partial = Passage(passage.source, passage.text[:length] + " ...", passage.index)
+        partial.tokens = count_tokens(partial.text)
+        if partial.tokens <= tokens:
+            return partial
+        length = int(length * tokens / partial.tokens * 0.95)
+    return None
+
+
+def _render(passages: List[Passage]) -> str:
+    parts = []
+    source = None
+    for passage in passages:
+        if passage.source and passage.source != source:
+            parts.append(f"[{passage.source}]")
+            source = passage.source
+        parts.append(passage.text)
+    return "\n\n".join(parts)
@@ -1,12 +1,18 @@
 import asyncio
 from datetime import datetime
+import hashlib
+import json
+import os
+import time
 import uuid
 import yaml
 from typing import List, Optional, Dict, Any
 from loguru import logger
-from ..models.task import Task, TaskStep
+from ..models.task import StepOutput, Task, TaskStep
 from ..schemas.task import TaskCreate, TaskStepCreate
-from .workflow_engine import WorkflowEngine
+from .output_store import OutputStore, output_store
+from .workflow_engine import EventListener, WorkflowEngine, WorkflowGraph
+from .write_batcher import WriteBatcher, write_batcher
 
 DEFAULT_WORKFLOW = """
 desc: "Gia: General Intelligence Assistant Workflow"
@@ -45,6 +51,12 @@ nodes:
         GitHub examples: ${search_github.code_samples}
         
         Provide only the code, no explanations.
+    # Scraped pages and source files are cut to the passages most relevant to the task
+    prompt_budget:
+      query: "${inputs.input_text} ${understand_task.response}"
+      slots:
+        gather_information.results: 1024
+        search_github.code_samples: 1024
 
   - name: execute_code
     type: agent
@@ -79,4 +91,191 @@ nodes:
         Provide a clear summary of what was accomplished and any notable results.
 """
 
-# ... rest of the file remains the same ...
\ No newline at end of file
+class TaskProcessor:
+    def __init__(
+        self,
+        workflow: str = DEFAULT_WORKFLOW,
+        engine: Optional[WorkflowEngine] = None,
+        workflow_path: Optional[str] = None,
+        writer: Optional[WriteBatcher] = None,
+        outputs: Optional[OutputStore] = None
+    ):
+        self.workflow = workflow
+        self.workflow_path = workflow_path or os.getenv("WORKFLOW_PATH")
+        self.engine = engine or WorkflowEngine()
+        # Step checkpoints of all running tasks are committed together in batches
+        self.writer = writer or write_batcher
+        # Large step outputs are compressed into their own table
+        self.outputs = outputs or output_store
+
+    def get_workflow(self) -> WorkflowGraph:
+        """Compiled plan for the active workflow; a workflow file is reloaded when it changes"""
+        if self.workflow_path:
+            return self.engine.registry.load_file(self.workflow_path)
+        return self.engine.registry.get(self.workflow)
+
+    async def create_task(self, task: TaskCreate) -> Task:
+        now = datetime.utcnow()
+        task_id = str(uuid.uuid4())
+        db_task = Task(
+            id=task_id,
+            description=task.description,
+            status="pending",
+            created_at=now,
+            updated_at=now,
+            idempotency_key=task.idempotency_key,
+            request_hash=self.request_hash(task.description)
+        )
+        db_task.steps = [
+            TaskStep(
+                id=str(uuid.uuid4()),
+                task_id=task_id,
+                name=name.replace("_", " ").title(),
+                type=name,
+                status="pending",
+                position=position
+            )
+            for position, name in enumerate(self.get_workflow().order)
+        ]
+        return db_task
+
+    def request_hash(self, description: str) -> str:
+        """Identity of the work a submission asks for: its description under the active workflow"""
+        payload = json.dumps({"workflow": self.get_workflow().key, "description": description})
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def process_task(self, task: Task, listener: Optional[EventListener] = None) -> Task:
+        """Run a task's workflow, saving each step as soon as its node finishes.
+
+        Steps completed by an earlier attempt are passed to the engine as checkpoints,
+        so after a crash, retry or re-run only nodes whose inputs changed execute again.
+        The run is bounded by the task's deadline; cancelling this coroutine cancels
+        the running agents.
+        """
+        task.status = "processing"
+        if listener:
+            listener({"type": "task", "status": task.status})
+        steps = {step.type: step for step in task.steps}
+        saved = set()
+
+        async def save_step(name: str, node_result: Dict[str, Any]):
+            step = steps.get(name)
+            if step is None:
+                return
+            stored = await self._apply_result(step, node_result)
+            writes = [self.writer.update(
+                TaskStep,
+                step.id,
+                {
+                    "status": step.status,
+                    "output": step.output,
+                    "output_size": step.output_size,
+                    "output_stored": step.output_stored,
+                    "input_hash": step.input_hash,
+                    "timing": step.timing
+                }
+            )]
+            if stored is not None:
+                # Queued together so the row and its full output commit in one transaction
+                writes.append(self.writer.replace(StepOutput, step.id, stored))
+            await asyncio.gather(*writes)
+            saved.add(name)
+
+        deadline = None
+        if task.deadline_at is not None:
+            deadline = time.monotonic() + (task.deadline_at - datetime.utcnow()).total_seconds()
+
+        try:
+            result = await self.engine.run_graph(
+                self.get_workflow(),
+                {"input_text": task.description},
+                listener,
+                checkpoints=await self._checkpoints(task.steps),
+                on_node_done=save_step,
+                deadline=deadline,
+                reuse_results=self._first_run(task)
+            )
+            for name, node_result in result["nodes"].items():
+                step = steps.get(name)
+                if step is not None and name not in saved and not node_result.get("cached"):
+                    stored = await self._apply_result(step, node_result)
+                    if stored is not None:
+                        await self.writer.replace(StepOutput, step.id, stored)
+
+            output = result["output"]
+            task.result = output.get("response") if isinstance(output, dict) else output
+            task.status = result["status"]
+            reused = sum(1 for node_result in result["nodes"].values() if node_result.get("cached"))
+            logger.info(
+                f"Task {task.id} {task.status} in {result['timing']['total']:.2f}s "
+                f"(critical path {' -> '.join(result['timing']['critical_path'])}: "
+                f"{result['timing']['critical_path_time']:.2f}s, {reused} steps reused)"
+            )
+        except Exception as e:
+            logger.error(f"Error processing task {task.id}: {str(e)}")
+            task.status = "failed"
+            task.result = str(e)
+        task.updated_at = datetime.utcnow()
+        if listener:
+            listener({"type": "task", "status": task.status, "result": task.result})
+        return task
+
+    def reset_steps(self, task: Task, from_step: Optional[str] = None) -> List[str]:
+        """Clear the saved output of the steps a re-run must execute again.
+
+        With from_step, that step and every step depending on it are reset; otherwise
+        only steps that did not complete are. Returns the ids of the reset steps.
+        """
+        graph = self.get_workflow()
+        if from_step is not None and from_step not in graph.nodes:
+            raise ValueError(f"Unknown step: {from_step}")
+        rerun = graph.downstream(from_step) if from_step is not None else None
+        reset = []
+        for step in task.steps:
+            if (step.type in rerun) if rerun is not None else step.status != "completed":
+                step.status = "pending"
+                step.output = None
+                step.output_size = None
+                step.output_stored = False
+                step.input_hash = None
+                step.timing = None
+                reset.append(step.id)
+        return reset
+
+    @staticmethod
+    def _first_run(task: Task) -> bool:
+        # Retries and re-runs both make the task available later than it was created
+        return task.attempts <= 1 and task.available_at in (None, task.created_at)
+
+    async def _checkpoints(self, steps: List[TaskStep]) -> Dict[str, Dict[str, Any]]:
+        candidates = [
+            step for step in steps
+            if step.status == "completed" and step.input_hash and step.output is not None
+        ]
+        stored = await self.outputs.load(step.id for step in candidates if step.output_stored)
+        checkpoints = {}
+        for step in candidates:
+            text = stored.get(step.id) if step.output_stored else step.output
+            if text is None:
+                continue
+            try:
+                checkpoints[step.type] = {"input_hash": step.input_hash, "output": json.loads(text)}
+            except ValueError:
+                continue
+        return checkpoints
+
+    async def _apply_result(self, step: TaskStep, node_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Copy a node result to its step; returns the StepOutput values to store when the
+        output is too large to keep in the row"""
+        step.status = node_result["status"]
+        step.input_hash = node_result.get("input_hash") if step.status == "completed" else None
+        step.timing = json.dumps(node_result["timing"]) if node_result.get("timing") else None
+        if node_result.get("output") is not None:
+            text = json.dumps(node_result["output"], default=str)
+        elif node_result.get("error"):
+            text = node_result["error"]
+        else:
+            return None
+        step.output, step.output_size, stored = await self.outputs.pack(text)
+        step.output_stored = stored is not None
+        return stored
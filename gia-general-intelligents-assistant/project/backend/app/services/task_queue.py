@@ -0,0 +1,307 @@
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import os
+from loguru import logger
+from sqlalchemy import and_, func, or_, select, update
+from ..models.database import async_session
+from ..models.task import Task, TaskStep
+
+
+class QueueFullError(Exception):
+    def __init__(self, depth: int, retry_after: int):
+        super().__init__(f"Task queue is full ({depth} tasks waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class TaskQueue:
+    """Durable task queue on the tasks table.
+
+    A task waits with status "pending" until a worker claims it, which sets status
+    "processing" and a lease that the worker renews with heartbeats. A task whose lease
+    expires (its worker died) is claimed again; each claim counts as an attempt, and a
+    task failing with an exception is retried with exponential backoff until
+    max_attempts is reached. Claims are conditional updates, so workers in several
+    processes never run the same task at once.
+
+    Every queued task gets a deadline from its timeout; a task still pending at its
+    deadline fails without running. Cancelling a running task sets cancel_requested,
+    which the worker holding it polls for.
+
+    Submissions are deduplicated against the table too: by idempotency key, and by
+    request hash against tasks that are queued, running or completed within
+    result_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        max_depth: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        retry_backoff: float = 5
+    ):
+        self.session_factory = session_factory
+        self.max_depth = max_depth if max_depth is not None else int(os.getenv("MAX_QUEUE_DEPTH", "100"))
+        self.lease_seconds = lease_seconds if lease_seconds is not None else float(os.getenv("TASK_LEASE_SECONDS", "60"))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+        self.retry_backoff = retry_backoff
+        self.default_timeout = float(os.getenv("TASK_TIMEOUT", "1800"))
+        self.result_ttl = float(os.getenv("TASK_RESULT_TTL", "300"))
+
+    async def enqueue(self, session, task: Task, priority: int = 0, timeout: Optional[float] = None):
+        """Add a new task to the session as pending; raises QueueFullError when saturated"""
+        depth = await self.depth(session)
+        if depth >= self.max_depth:
+            raise QueueFullError(depth, retry_after=max(int(self.lease_seconds), 1))
+        task.status = "pending"
+        task.priority = priority
+        task.attempts = 0
+        task.max_attempts = self.max_attempts
+        task.available_at = task.created_at
+        task.timeout = timeout or self.default_timeout
+        task.deadline_at = task.created_at + timedelta(seconds=task.timeout)
+        task.cancel_requested = False
+        session.add(task)
+
+    async def requeue(self, session, task: Task):
+        """Put a finished task back in the queue as a fresh job"""
+        depth = await self.depth(session)
+        if depth >= self.max_depth:
+            raise QueueFullError(depth, retry_after=max(int(self.lease_seconds), 1))
+        now = datetime.utcnow()
+        task.status = "pending"
+        task.result = None
+        task.attempts = 0
+        task.available_at = now
+        task.updated_at = now
+        task.lease_owner = None
+        task.lease_expires_at = None
+        task.deadline_at = now + timedelta(seconds=task.timeout or self.default_timeout)
+        task.cancel_requested = False
+
+    async def find_by_key(self, session, idempotency_key: str) -> Optional[Task]:
+        result = await session.execute(select(Task).where(Task.idempotency_key == idempotency_key))
+        return result.scalars().first()
+
+    async def find_duplicate(self, session, request_hash: str) -> Optional[Task]:
+        """Newest task with the same request hash that a new submission can share"""
+        shareable = Task.status.in_(("pending", "processing"))
+        if self.result_ttl:
+            recent = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+            shareable = or_(shareable, and_(Task.status == "completed", Task.updated_at >= recent))
+        result = await session.execute(
+            select(Task)
+            .where(Task.request_hash == request_hash, shareable, Task.cancel_requested.is_(False))
+            .order_by(Task.created_at.desc())
+            .limit(1)
+        )
+        return result.scalars().first()
+
+    async def depth(self, session) -> int:
+        result = await session.execute(select(func.count()).select_from(Task).where(Task.status == "pending"))
+        return result.scalar_one()
+
+    async def position(self, session, task: Task) -> Optional[int]:
+        """Number of pending tasks that will be claimed before this one"""
+        if task.status != "pending":
+            return None
+        result = await session.execute(
+            select(func.count()).select_from(Task).where(
+                Task.status == "pending",
+                Task.id != task.id,
+                or_(
+                    Task.priority > task.priority,
+                    and_(Task.priority == task.priority, Task.created_at < task.created_at)
+                )
+            )
+        )
+        return result.scalar_one()
+
+    async def claim(self, worker_id: str) -> Optional[str]:
+        """Lease the next runnable task to worker_id and return its id"""
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            await self._fail_unrunnable(session, now)
+            runnable = or_(
+                and_(Task.status == "pending", or_(Task.available_at.is_(None), Task.available_at <= now)),
+                and_(Task.status == "processing", Task.lease_expires_at < now)
+            )
+            candidates = await session.execute(
+                select(Task.id, Task.status)
+                .where(runnable)
+                .order_by(Task.priority.desc(), Task.created_at)
+                .limit(8)
+            )
+            for task_id, status in candidates.all():
+                claimed = await session.execute(
+                    update(Task)
+                    .where(Task.id == task_id, runnable)
+                    .values(
+                        status="processing",
+                        lease_owner=worker_id,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        attempts=Task.attempts + 1,
+                        updated_at=now
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount == 1:
+                    await session.commit()
+                    if status == "processing":
+                        logger.warning(f"Reclaimed task {task_id} after its lease expired")
+                    return task_id
+            await session.commit()
+        return None
+
+    async def _fail_unrunnable(self, session, now: datetime):
+        await session.execute(
+            update(Task)
+            .where(Task.status == "pending", Task.deadline_at < now)
+            .values(status="failed", result="Deadline exceeded before the task started", updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        # Tasks whose worker died on the last allowed attempt are not run again
+        await session.execute(
+            update(Task)
+            .where(
+                Task.status == "processing",
+                Task.lease_expires_at < now,
+                Task.attempts >= Task.max_attempts
+            )
+            .values(
+                status="failed",
+                result="Task abandoned: worker lease expired on the final attempt",
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def heartbeat(self, task_id: str, worker_id: str) -> bool:
+        """Extend the lease; False means the lease was lost to another worker"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.lease_owner == worker_id, Task.status == "processing")
+                .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_seconds))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def complete(self, session, task: Task, worker_id: str) -> bool:
+        """Commit a processed task if worker_id still holds its lease"""
+        owned = await session.execute(
+            update(Task)
+            .where(Task.id == task.id, Task.lease_owner == worker_id)
+            .values(lease_owner=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        if owned.rowcount != 1:
+            await session.rollback()
+            logger.warning(f"Discarding result of task {task.id}: lease lost by {worker_id}")
+            return False
+        await session.commit()
+        return True
+
+    async def release(self, task_id: str, worker_id: str, error: str):
+        """Return a task that raised to the queue, or fail it once its attempts are used up"""
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            task = await session.get(Task, task_id)
+            if task is None or task.lease_owner != worker_id:
+                return
+            task.lease_owner = None
+            task.lease_expires_at = None
+            task.updated_at = now
+            if task.attempts < task.max_attempts:
+                delay = self.retry_backoff * 2 ** (task.attempts - 1)
+                task.status = "pending"
+                task.available_at = now + timedelta(seconds=delay)
+                logger.warning(f"Task {task_id} attempt {task.attempts} failed, retrying in {delay:.0f}s: {error}")
+            else:
+                task.status = "failed"
+                task.result = error
+                logger.error(f"Task {task_id} failed after {task.attempts} attempts: {error}")
+            await session.commit()
+
+    async def cancel(self, session, task_id: str) -> Optional[str]:
+        """Cancel a pending task outright, or flag a running one for its worker to stop.
+
+        Returns "cancelled", "cancelling", or None if the task had already finished.
+        """
+        now = datetime.utcnow()
+        pending = await session.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.status == "pending")
+            .values(status="cancelled", result="Cancelled", updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if pending.rowcount == 1:
+            await self._cancel_steps(session, task_id)
+            return "cancelled"
+        running = await session.execute(
+            update(Task)
+            .where(Task.id == task_id, Task.status == "processing")
+            .values(cancel_requested=True)
+            .execution_options(synchronize_session=False)
+        )
+        return "cancelling" if running.rowcount == 1 else None
+
+    async def cancel_requests(self, worker_id: str) -> List[str]:
+        """Ids of this worker's tasks that have been asked to stop"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Task.id).where(
+                    Task.lease_owner == worker_id,
+                    Task.status == "processing",
+                    Task.cancel_requested.is_(True)
+                )
+            )
+            return list(result.scalars())
+
+    async def finish_cancelled(self, task_id: str, worker_id: str):
+        """Record that a worker stopped a task it was asked to cancel"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(Task)
+                .where(Task.id == task_id, Task.lease_owner == worker_id)
+                .values(
+                    status="cancelled",
+                    result="Cancelled",
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    updated_at=datetime.utcnow()
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 1:
+                await self._cancel_steps(session, task_id)
+            await session.commit()
+
+    @staticmethod
+    async def _cancel_steps(session, task_id: str):
+        # Completed steps keep their checkpoints, so a later re-run can reuse them
+        await session.execute(
+            update(TaskStep)
+            .where(TaskStep.task_id == task_id, TaskStep.status.in_(("pending", "running")))
+            .values(status="cancelled")
+            .execution_options(synchronize_session=False)
+        )
+
+    async def get_stats(self) -> Dict[str, Any]:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Task.status, func.count()).where(Task.status.in_(("pending", "processing"))).group_by(Task.status)
+            )
+            counts = dict(result.all())
+        return {
+            "pending": counts.get("pending", 0),
+            "processing": counts.get("processing", 0),
+            "max_depth": self.max_depth
+        }
+
+
+task_queue = TaskQueue()
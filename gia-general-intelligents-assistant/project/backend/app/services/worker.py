@@ -0,0 +1,311 @@
+"""Workers that run queued tasks.
+
+Run inside the API process (TASK_WORKERS=0), as a pool of processes started by the API
+(TASK_WORKERS=N, progress events and metrics are forwarded back), or standalone with
+`python -m app.services.worker` against a shared database (set METRICS_PORT to serve
+its metrics).
+"""
+from typing import Dict, Any, List, Optional, Set
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from datetime import datetime
+from loguru import logger
+from ..models.task import Task
+from .events import task_events
+from .metrics import metrics, serve as serve_metrics
+from .task_processor import TaskProcessor
+from .task_queue import TaskQueue, task_queue
+
+task_queue_wait = metrics.histogram(
+    "gia_task_queue_wait_seconds", "Time from a task becoming runnable until a worker claimed it"
+)
+task_seconds = metrics.histogram("gia_task_seconds", "Run time of claimed tasks", ("status",))
+tasks_running = metrics.gauge("gia_tasks_running", "Tasks being run by workers")
+
+
+class TaskWorker:
+    """Claims tasks from the queue and runs up to `concurrency` of them at once"""
+
+    def __init__(
+        self,
+        processor: TaskProcessor,
+        queue: TaskQueue = task_queue,
+        events=task_events,
+        concurrency: Optional[int] = None,
+        poll_interval: float = 1.0,
+        cancel_poll_interval: float = 1.0
+    ):
+        self.processor = processor
+        self.queue = queue
+        self.events = events
+        self.concurrency = concurrency or int(os.getenv("TASK_CONCURRENCY", "2"))
+        self.poll_interval = poll_interval
+        self.cancel_poll_interval = cancel_poll_interval
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running: Set[asyncio.Task] = set()
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._cancelling: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def notify(self):
+        """Wake the claim loop right away, e.g. after a task was enqueued in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, task_id: str) -> bool:
+        """Stop a task running on this worker; its agents are cancelled right away"""
+        job = self._jobs.get(task_id)
+        if job is None or job.done():
+            return False
+        self._cancelling.add(task_id)
+        job.cancel()
+        return True
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        watcher = asyncio.create_task(self._watch_cancellations())
+        try:
+            await self._claim_loop()
+        finally:
+            watcher.cancel()
+
+    async def _claim_loop(self):
+        while not self._stopping:
+            if len(self._running) >= self.concurrency:
+                await asyncio.wait(self._running, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                task_id = await self.queue.claim(self.worker_id)
+            except Exception as e:
+                logger.error(f"Error claiming task: {str(e)}")
+                task_id = None
+            if task_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            job = asyncio.create_task(self._process(task_id))
+            self._running.add(job)
+            self._jobs[task_id] = job
+            job.add_done_callback(self._running.discard)
+            job.add_done_callback(lambda _, task_id=task_id: self._jobs.pop(task_id, None))
+
+    async def _watch_cancellations(self):
+        # Cancellation requested through another process (API or another worker) is seen here
+        while True:
+            await asyncio.sleep(self.cancel_poll_interval)
+            if not self._jobs:
+                continue
+            try:
+                for task_id in await self.queue.cancel_requests(self.worker_id):
+                    if task_id not in self._cancelling:
+                        self.cancel(task_id)
+            except Exception as e:
+                logger.error(f"Error polling cancellation requests: {str(e)}")
+
+    async def stop(self, timeout: float = 30):
+        """Stop claiming and give running tasks `timeout` seconds to finish; the rest are
+        picked up again by another worker once their leases expire"""
+        self._stopping = True
+        self.notify()
+        if self._running:
+            await asyncio.wait(self._running, timeout=timeout)
+
+    async def _process(self, task_id: str):
+        self.events.open(task_id)
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        started = time.perf_counter()
+        status = "failed"
+        tasks_running.inc()
+        try:
+            async with self.queue.session_factory() as session:
+                task = await session.get(Task, task_id)
+                if task is None:
+                    status = "missing"
+                    return
+                # End the read transaction so no pooled connection is held while the workflow
+                # runs (steps are saved through the write batcher); complete() opens a new one
+                await session.commit()
+                runnable_at = task.available_at or task.created_at
+                task_queue_wait.observe(max((datetime.utcnow() - runnable_at).total_seconds(), 0.0))
+                await self.processor.process_task(
+                    task,
+                    listener=lambda event: self.events.publish(task_id, event)
+                )
+                await self.queue.complete(session, task, self.worker_id)
+                status = task.status
+        except asyncio.CancelledError:
+            if task_id not in self._cancelling:
+                status = "interrupted"
+                raise
+            status = "cancelled"
+            logger.info(f"Task {task_id} cancelled")
+            await self.queue.finish_cancelled(task_id, self.worker_id)
+            self.events.publish(task_id, {"type": "task", "status": "cancelled", "result": "Cancelled"})
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} failed on task {task_id}: {str(e)}")
+            await self.queue.release(task_id, self.worker_id, str(e))
+        finally:
+            heartbeat.cancel()
+            tasks_running.dec()
+            task_seconds.observe(time.perf_counter() - started, status=status)
+            self._cancelling.discard(task_id)
+            # Closed after the commit so a client reconnecting on "end" reads the final state
+            self.events.close(task_id)
+
+    async def _heartbeat(self, task_id: str):
+        interval = self.queue.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not await self.queue.heartbeat(task_id, self.worker_id):
+                    logger.warning(f"Worker {self.worker_id} lost the lease on task {task_id}")
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat for task {task_id} failed: {str(e)}")
+
+    def get_status(self) -> Dict[str, Any]:
+        return {"worker_id": self.worker_id, "concurrency": self.concurrency, "running": len(self._running)}
+
+
+class EventForwarder:
+    """Task event sink of a worker process; events are relayed to the API's broker"""
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def open(self, task_id: str):
+        self.queue.put(("open", task_id, None))
+
+    def publish(self, task_id: str, event: Dict[str, Any]):
+        self.queue.put(("publish", task_id, event))
+
+    def close(self, task_id: str):
+        self.queue.put(("close", task_id, None))
+
+    async def report_metrics(self, interval: float = 5):
+        """Send this process's metrics to the API every `interval` seconds"""
+        source = str(os.getpid())
+        while True:
+            self.queue.put(("metrics", source, metrics.snapshot()))
+            await asyncio.sleep(interval)
+
+
+def _worker_process(concurrency: Optional[int], event_queue=None):
+    worker = TaskWorker(
+        TaskProcessor(),
+        events=EventForwarder(event_queue) if event_queue is not None else task_events,
+        concurrency=concurrency
+    )
+    asyncio.run(_run_until_signalled(worker))
+
+
+async def _run_until_signalled(worker: TaskWorker):
+    from ..models.database import engine
+    from .agents.registry import agent_registry
+
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_requested.set)
+    runner = asyncio.create_task(worker.run())
+    reporter = None
+    if isinstance(worker.events, EventForwarder):
+        reporter = asyncio.create_task(worker.events.report_metrics())
+    elif os.getenv("METRICS_PORT"):
+        serve_metrics(int(os.getenv("METRICS_PORT")))
+    try:
+        await stop_requested.wait()
+        await worker.stop()
+    finally:
+        runner.cancel()
+        if reporter is not None:
+            reporter.cancel()
+            worker.events.queue.put(("metrics", str(os.getpid()), metrics.snapshot()))
+        await agent_registry.cleanup()
+        await engine.dispose()
+
+
+class WorkerPool:
+    """Worker processes started and supervised by the API process"""
+
+    def __init__(self, size: int, concurrency: Optional[int] = None, events=task_events):
+        self.size = size
+        self.concurrency = concurrency
+        self.events = events
+        # spawn gives each worker a clean interpreter: no inherited event loop, threads or models
+        self._context = multiprocessing.get_context("spawn")
+        self._event_queue = self._context.Queue()
+        self._processes: List[multiprocessing.Process] = []
+        self._forwarder: Optional[threading.Thread] = None
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._processes = [self._spawn() for _ in range(self.size)]
+        self._forwarder = threading.Thread(
+            target=self._forward_events, args=(loop,), name="worker-events", daemon=True
+        )
+        self._forwarder.start()
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    def _spawn(self) -> multiprocessing.Process:
+        process = self._context.Process(
+            target=_worker_process, args=(self.concurrency, self._event_queue), name="gia-worker"
+        )
+        process.start()
+        logger.info(f"Started worker process {process.pid}")
+        return process
+
+    def _forward_events(self, loop: asyncio.AbstractEventLoop):
+        while True:
+            message = self._event_queue.get()
+            if message is None:
+                return
+            kind, task_id, event = message
+            if kind == "metrics":
+                metrics.update_remote(task_id, event)
+                continue
+            args = (task_id,) if event is None else (task_id, event)
+            loop.call_soon_threadsafe(getattr(self.events, kind), *args)
+
+    async def _supervise(self, interval: float = 5):
+        # A crashed worker is replaced; its tasks are reclaimed when their leases expire
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    logger.error(f"Worker process {process.pid} exited with {process.exitcode}, restarting")
+                    self._processes[index] = self._spawn()
+
+    async def stop(self, timeout: float = 30):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        for process in self._processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.kill()
+        self._event_queue.put(None)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "processes": [{"pid": p.pid, "alive": p.is_alive()} for p in self._processes],
+            "concurrency": self.concurrency or int(os.getenv("TASK_CONCURRENCY", "2"))
+        }
+
+
+if __name__ == "__main__":
+    _worker_process(None)
@@ -1,18 +1,618 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Awaitable, Callable, FrozenSet, List, Mapping, Optional, Set, Tuple
+from collections import OrderedDict
+from types import MappingProxyType
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
 import yaml
 from loguru import logger
-from .agents.scraper_agent import ScraperAgent
-from .agents.github_agent import GitHubAgent
-from .agents.code_execution_agent import CodeExecutionAgent
-from .agents.llm_agent import LLMAgent
+from . import deadline as deadlines
+from . import prompt_assembly
+from .agents.base_agent import BaseAgent
+from .agents.registry import AgentRegistry, agent_registry
+from .cache import TTLCache
+from .coalescing import CallCoalescer, TokenCallback
+from .metrics import metrics
+
+EventListener = Callable[[Dict[str, Any]], None]
+Reference = Tuple[str, Tuple[str, ...]]
+# Returns the text to use for a referenced value, or None to render it unchanged
+SlotFitter = Callable[[Reference, Any], Optional[str]]
+# Called with a node's name and result as soon as the node finishes
+NodeCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+node_seconds = metrics.histogram(
+    "gia_node_seconds", "Run time of workflow nodes that executed", ("node", "status")
+)
+node_queue_wait = metrics.histogram(
+    "gia_node_queue_wait_seconds", "Time a ready node waited for a concurrency slot", ("node",)
+)
+node_results = metrics.counter(
+    "gia_nodes_total", "Workflow nodes by outcome (completed, failed, skipped, cached)", ("node", "status")
+)
+prompt_context_tokens = metrics.counter(
+    "gia_prompt_context_tokens_total",
+    "Tokens of budgeted prompt inputs kept and dropped by prompt assembly",
+    ("node", "slot", "kind")
+)
+
+PLACEHOLDER_PATTERN = re.compile(r"\$\{([A-Za-z_]\w*)((?:\.\w+)+)\}")
+
+
+class Template:
+    """A string pre-split into literal parts and (node, path) references"""
+    __slots__ = ("parts", "references", "single")
+
+    def __init__(self, text: str):
+        parts: List[Any] = []
+        pos = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > pos:
+                parts.append(text[pos:match.start()])
+            parts.append((match.group(1), tuple(match.group(2).strip(".").split("."))))
+            pos = match.end()
+        if pos < len(text):
+            parts.append(text[pos:])
+
+        single = PLACEHOLDER_PATTERN.fullmatch(text.strip())
+        self.parts = tuple(parts)
+        self.references = frozenset(part[0] for part in parts if isinstance(part, tuple))
+        # A value that is a single placeholder keeps the referenced value's type
+        self.single = (
+            (single.group(1), tuple(single.group(2).strip(".").split(".")))
+            if single else None
+        )
+
+    def render(self, context: Dict[str, Any], fit: Optional[SlotFitter] = None) -> Any:
+        if self.single:
+            return _resolve_reference(context, self.single, fit)
+        # One join over all parts instead of a replace per placeholder
+        return "".join(
+            part if isinstance(part, str) else _to_text(_resolve_reference(context, part, fit))
+            for part in self.parts
+        )
+
+
+def _resolve_reference(context: Dict[str, Any], reference: Reference, fit: Optional[SlotFitter]) -> Any:
+    value = lookup_reference(context, *reference)
+    if fit is not None:
+        fitted = fit(reference, value)
+        if fitted is not None:
+            return fitted
+    return value
+
+
+class PromptBudget:
+    """Token budgets for values a node interpolates into its inputs.
+
+    Declared on a node as
+        prompt_budget:
+          query: ${inputs.input_text}     # what the kept passages should be relevant to
+          slots:
+            gather_information.results: 1024
+    A placeholder referencing a budgeted slot is filled with the passages of that value
+    most relevant to the query that fit in its budget, counted with the agent's tokenizer.
+    """
+    __slots__ = ("query", "slots")
+
+    def __init__(self, spec: Mapping[str, Any]):
+        self.query = compile_inputs(spec.get("query", "${inputs.input_text}"))
+        self.slots: Dict[Reference, int] = {}
+        for reference, tokens in (spec.get("slots") or {}).items():
+            node, _, path = reference.partition(".")
+            if not path:
+                raise ValueError(f"Prompt budget slot must be NODE.PATH, got '{reference}'")
+            self.slots[(node, tuple(path.split(".")))] = int(tokens)
+
+
+def compile_inputs(value: Any) -> Any:
+    if isinstance(value, str):
+        return Template(value) if PLACEHOLDER_PATTERN.search(value) else value
+    if isinstance(value, dict):
+        return MappingProxyType({key: compile_inputs(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(compile_inputs(item) for item in value)
+    return value
+
+
+def resolve_inputs(compiled: Any, context: Dict[str, Any], fit: Optional[SlotFitter] = None) -> Any:
+    """Render compiled node inputs against the outputs gathered so far"""
+    if isinstance(compiled, Template):
+        return compiled.render(context, fit)
+    if isinstance(compiled, MappingProxyType):
+        return {key: resolve_inputs(item, context, fit) for key, item in compiled.items()}
+    if isinstance(compiled, tuple):
+        return [resolve_inputs(item, context, fit) for item in compiled]
+    return compiled
+
+
+def _references(compiled: Any) -> FrozenSet[str]:
+    if isinstance(compiled, Template):
+        return compiled.references - {"inputs"}
+    if isinstance(compiled, MappingProxyType):
+        compiled = tuple(compiled.values())
+    if isinstance(compiled, tuple):
+        return frozenset().union(*(_references(item) for item in compiled))
+    return frozenset()
+
+
+def lookup_reference(context: Dict[str, Any], node: str, path: Tuple[str, ...]) -> Any:
+    value = context.get(node)
+    for key in path:
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return None
+    return value
+
+
+def input_hash(node: Mapping[str, Any], node_inputs: Any) -> str:
+    """Hash of what a node runs on; a node with an unchanged hash can reuse its last output"""
+    payload = json.dumps(
+        {"agent_type": node.get("agent_type"), "inputs": node_inputs},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _to_text(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def _notify(listener: Optional[EventListener], event: Dict[str, Any]):
+    if listener is None:
+        return
+    try:
+        listener(event)
+    except Exception as e:
+        logger.error(f"Workflow event listener failed: {str(e)}")
+
+
+class WorkflowGraph:
+    """Compiled, read-only plan of a workflow: nodes, pre-split input templates and dependencies"""
+
+    def __init__(self, definition: Dict[str, Any], key: Optional[str] = None):
+        self.key = key
+        nodes: Dict[str, Any] = {}
+        for node in definition.get("nodes", []):
+            if node["name"] in nodes or node["name"] == "inputs":
+                raise ValueError(f"Duplicate or reserved node name: {node['name']}")
+            nodes[node["name"]] = MappingProxyType(dict(node))
+        self.nodes: Mapping[str, Mapping[str, Any]] = MappingProxyType(nodes)
+
+        self.inputs: Mapping[str, Any] = MappingProxyType({
+            name: compile_inputs(node.get("inputs") or {}) for name, node in nodes.items()
+        })
+        self.prompt_budgets: Mapping[str, PromptBudget] = MappingProxyType({
+            name: PromptBudget(node["prompt_budget"]) for name, node in nodes.items() if node.get("prompt_budget")
+        })
+        self.dependencies: Mapping[str, FrozenSet[str]] = MappingProxyType({
+            name: _references(inputs) | (
+                _references(self.prompt_budgets[name].query) if name in self.prompt_budgets else frozenset()
+            )
+            for name, inputs in self.inputs.items()
+        })
+        dependents: Dict[str, Set[str]] = {name: set() for name in nodes}
+        for name, deps in self.dependencies.items():
+            for dep in deps:
+                if dep not in nodes:
+                    raise ValueError(f"Node '{name}' references unknown node '{dep}'")
+                dependents[dep].add(name)
+        self.dependents: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {name: frozenset(deps) for name, deps in dependents.items()}
+        )
+
+        self.order: Tuple[str, ...] = self._topological_order()
+        self.output_reference = (definition.get("outputs") or {}).get("reference")
+
+    @classmethod
+    def from_yaml(cls, workflow_yaml: str, key: Optional[str] = None) -> "WorkflowGraph":
+        return cls(yaml.safe_load(workflow_yaml), key)
+
+    def downstream(self, name: str) -> Set[str]:
+        """A node together with every node that depends on it, directly or transitively"""
+        found = {name}
+        pending = [name]
+        while pending:
+            for dependent in self.dependents[pending.pop()]:
+                if dependent not in found:
+                    found.add(dependent)
+                    pending.append(dependent)
+        return found
+
+    def _topological_order(self) -> Tuple[str, ...]:
+        # Kahn's algorithm, ties broken by declaration order so runs are reproducible
+        remaining = {name: len(deps) for name, deps in self.dependencies.items()}
+        ready = [name for name in self.nodes if remaining[name] == 0]
+        order = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for dependent in self.nodes:
+                if dependent in self.dependents[name]:
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        ready.append(dependent)
+        if len(order) != len(self.nodes):
+            cycle = sorted(set(self.nodes) - set(order))
+            raise ValueError(f"Workflow contains a dependency cycle between: {cycle}")
+        return tuple(order)
+
+
+class WorkflowRegistry:
+    """LRU cache of compiled workflows keyed by a hash of their source"""
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._plans: "OrderedDict[str, WorkflowGraph]" = OrderedDict()
+        self._files: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(workflow_yaml: str) -> str:
+        return hashlib.sha256(workflow_yaml.encode()).hexdigest()
+
+    def get(self, workflow_yaml: str) -> WorkflowGraph:
+        key = self.content_key(workflow_yaml)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+        plan = WorkflowGraph.from_yaml(workflow_yaml, key)
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def load_file(self, path: str) -> WorkflowGraph:
+        """Return the plan for a workflow file, recompiling only when the file has changed"""
+        stat = os.stat(path)
+        cached = self._files.get(path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            with self._lock:
+                plan = self._plans.get(cached[2])
+                if plan is not None:
+                    self._plans.move_to_end(cached[2])
+                    return plan
+
+        with open(path, "r") as f:
+            plan = self.get(f.read())
+        if cached and cached[2] != plan.key:
+            logger.info(f"Reloaded workflow {path}")
+        self._files[path] = (stat.st_mtime_ns, stat.st_size, plan.key)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self._files.clear()
+
+
+workflow_registry = WorkflowRegistry()
+agent_calls = CallCoalescer("agent")
+agent_results = TTLCache(
+    max_size=int(os.getenv("AGENT_RESULT_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("AGENT_RESULT_TTL", "300")),
+    name="agent_results"
+)
+
 
 class WorkflowEngine:
-    def __init__(self):
-        self.agents = {
-            "scraper": ScraperAgent(),
-            "github": GitHubAgent(),
-            "code_execution": CodeExecutionAgent(),
-            "llm": LLMAgent()  # Add the LLM agent
+    def __init__(
+        self,
+        config: Dict[str, Any] = None,
+        registry: Optional[WorkflowRegistry] = None,
+        agents: Optional[AgentRegistry] = None
+    ):
+        self.config = config or {}
+        self.max_concurrency = self.config.get("max_concurrency", 4)
+        # Default time budget of a node; a node can set its own with `timeout` in the workflow
+        self.node_timeout = self.config.get("node_timeout", float(os.getenv("NODE_TIMEOUT", "600")))
+        self.registry = registry or workflow_registry
+        # Agents are created on first use and shared with every other engine in the process
+        self.agents = agents or agent_registry
+        # Identical agent calls of concurrent tasks run once; recent successful outputs are reused
+        self.calls = agent_calls
+        self.results = agent_results if self.config.get("result_cache", True) and agent_results.ttl else None
+
+    async def execute_workflow(
+        self,
+        workflow_yaml: str,
+        inputs: Dict[str, Any],
+        listener: Optional[EventListener] = None
+    ) -> Dict[str, Any]:
+        """Run a workflow definition, compiling it only the first time it is seen"""
+        return await self.run_graph(self.registry.get(workflow_yaml), inputs, listener)
+
+    async def run_graph(
+        self,
+        graph: WorkflowGraph,
+        inputs: Dict[str, Any],
+        listener: Optional[EventListener] = None,
+        checkpoints: Optional[Dict[str, Dict[str, Any]]] = None,
+        on_node_done: Optional[NodeCallback] = None,
+        deadline: Optional[float] = None,
+        reuse_results: bool = True
+    ) -> Dict[str, Any]:
+        """Run the nodes of a workflow graph, executing independent nodes concurrently.
+
+        If a listener is given it receives node status transitions and, from agents that
+        support streaming, partial output as it is produced. `checkpoints` maps node
+        names to {"input_hash", "output"} of an earlier run: a node whose resolved inputs
+        hash the same is not executed again and reuses that output. `on_node_done` is
+        awaited with each node that actually ran, e.g. to persist it.
+
+        A node's agent call is shared with identical calls (same agent and resolved
+        inputs) already running in this process; a node with `coalesce: false` always
+        runs its own call. The successful output of a deterministic agent (or of a node
+        with `deterministic: true`) is reused for AGENT_RESULT_TTL seconds, unless
+        reuse_results is false, as for retries and re-runs that must execute again.
+
+        Each node runs within its time budget, cut short by `deadline` (a time.monotonic()
+        value for the whole run); a node over budget is cancelled and fails. Cancelling
+        run_graph cancels every running node.
+        """
+        checkpoints = checkpoints or {}
+        context: Dict[str, Any] = {"inputs": inputs}
+        results: Dict[str, Dict[str, Any]] = {}
+        running: Dict[asyncio.Task, str] = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.perf_counter()
+
+        def schedule_ready():
+            # graph.order is topological, so skips propagate transitively in one pass
+            for name in graph.order:
+                if name in results:
+                    continue
+                dep_states = [results.get(dep, {}).get("status") for dep in graph.dependencies[name]]
+                if any(state in ("failed", "skipped") for state in dep_states):
+                    results[name] = {"status": "skipped", "output": None, "timing": None}
+                    node_results.inc(node=name, status="skipped")
+                    _notify(listener, {"type": "node", "node": name, "status": "skipped"})
+                elif all(state == "completed" for state in dep_states):
+                    results[name] = {"status": "running"}
+                    task = asyncio.create_task(self._run_node(
+                        graph, name, context, semaphore, started, listener,
+                        checkpoints.get(name), on_node_done, deadline, reuse_results
+                    ))
+                    running[task] = name
+
+        try:
+            schedule_ready()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()
+                    if results[name]["status"] == "completed":
+                        context[name] = results[name]["output"]
+                    _notify(listener, {
+                        "type": "node",
+                        "node": name,
+                        "status": results[name]["status"],
+                        "duration": results[name]["timing"]["duration"],
+                        "cached": results[name].get("cached", False),
+                        "error": results[name].get("error")
+                    })
+                schedule_ready()
+        finally:
+            for task in running:
+                task.cancel()
+
+        total_time = time.perf_counter() - started
+        critical_path = self._critical_path(graph, results)
+        status = "completed" if all(r["status"] == "completed" for r in results.values()) else "failed"
+
+        return {
+            "status": status,
+            "output": context.get(graph.output_reference) if graph.output_reference else None,
+            "nodes": results,
+            "timing": {
+                "total": total_time,
+                "critical_path": critical_path,
+                "critical_path_time": results[critical_path[-1]]["timing"]["end"] if critical_path else 0.0,
+                "sum_node_time": sum(
+                    r["timing"]["duration"] for r in results.values() if r.get("timing")
+                )
+            }
         }
 
-    # ... rest of the file remains the same ...
\ No newline at end of file
+    async def _run_node(
+        self,
+        graph: WorkflowGraph,
+        name: str,
+        context: Dict[str, Any],
+        semaphore: asyncio.Semaphore,
+        started: float,
+        listener: Optional[EventListener] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        on_node_done: Optional[NodeCallback] = None,
+        deadline: Optional[float] = None,
+        reuse_results: bool = True
+    ) -> Dict[str, Any]:
+        node = graph.nodes[name]
+        ready_at = time.perf_counter() - started
+        assembly = None
+        if name in graph.prompt_budgets:
+            node_inputs, assembly = await self._assemble(graph, name, context, listener)
+        else:
+            node_inputs = resolve_inputs(graph.inputs[name], context)
+        node_hash = input_hash(node, node_inputs)
+        if checkpoint is not None and checkpoint.get("input_hash") == node_hash:
+            node_results.inc(node=name, status="cached")
+            return {
+                "status": "completed",
+                "output": checkpoint["output"],
+                "input_hash": node_hash,
+                "cached": True,
+                "timing": {"ready": ready_at, "start": ready_at, "end": ready_at, "queue_wait": 0.0, "duration": 0.0}
+            }
+
+        async with semaphore:
+            start = time.perf_counter() - started
+            _notify(listener, {"type": "node", "node": name, "status": "running"})
+            budget = self._budget(node, deadline)
+            node_deadline = None
+            try:
+                if budget is not None and budget <= 0:
+                    raise deadlines.DeadlineExceeded("Task deadline exceeded before the node started")
+                # Agents see the budget as their deadline; wait_for cancels them if they overrun it
+                with deadlines.scope(budget) as node_deadline:
+                    output = await asyncio.wait_for(
+                        self._call_agent(node, name, node_inputs, node_hash, listener, reuse_results),
+                        timeout=budget
+                    )
+                if isinstance(output, dict) and output.get("status") == "error":
+                    raise RuntimeError(output.get("error", "Agent reported an error"))
+                status, error = "completed", None
+            except deadlines.DeadlineExceeded as e:
+                logger.error(f"Workflow node {name} failed: {str(e)}")
+                output, status, error = None, "failed", str(e)
+            except asyncio.TimeoutError as e:
+                # The builtin TimeoutError since Python 3.11: agents raise it too (sockets,
+                # subprocesses), so only an expired budget is reported as the node timing out
+                if budget is not None and node_deadline is not None and time.monotonic() >= node_deadline:
+                    logger.error(f"Workflow node {name} timed out after {budget:.1f}s")
+                    output, status, error = None, "failed", f"Timed out after {budget:.1f}s"
+                else:
+                    logger.error(f"Workflow node {name} failed: {str(e) or e.__class__.__name__}")
+                    output, status, error = None, "failed", str(e) or e.__class__.__name__
+            except Exception as e:
+                logger.error(f"Workflow node {name} failed: {str(e)}")
+                output, status, error = None, "failed", str(e)
+            end = time.perf_counter() - started
+
+        node_queue_wait.observe(start - ready_at, node=name)
+        node_seconds.observe(end - start, node=name, status=status)
+        node_results.inc(node=name, status=status)
+        result = {
+            "status": status,
+            "output": output,
+            "input_hash": node_hash,
+            "timing": {
+                "ready": ready_at,
+                "start": start,
+                "end": end,
+                "queue_wait": start - ready_at,
+                "duration": end - start
+            }
+        }
+        if error:
+            result["error"] = error
+        if assembly:
+            result["context"] = assembly
+        if on_node_done is not None:
+            try:
+                await on_node_done(name, result)
+            except Exception as e:
+                logger.error(f"Checkpointing workflow node {name} failed: {str(e)}")
+        return result
+
+    async def _call_agent(
+        self,
+        node: Mapping[str, Any],
+        name: str,
+        node_inputs: Any,
+        node_hash: str,
+        listener: Optional[EventListener],
+        reuse_results: bool = True
+    ) -> Any:
+        agent = await self.agents.get(node.get("agent_type"))
+        on_token = None
+        if listener is not None and agent.supports_streaming:
+            on_token = lambda text: _notify(listener, {"type": "token", "node": name, "text": text})
+        if not node.get("coalesce", True):
+            return await self._execute(agent, node_inputs, on_token)
+
+        # Only outputs that the same inputs would reproduce are worth reusing
+        cacheable = self.results is not None and node.get("deterministic", agent.deterministic)
+        output = self.results.get(node_hash) if cacheable and reuse_results else None
+        if output is not None:
+            if on_token is not None and isinstance(output.get("response"), str):
+                on_token(output["response"])
+            return output
+        output = await self.calls.run(
+            node_hash,
+            lambda emit: self._execute(agent, node_inputs, emit if on_token is not None else None),
+            on_token
+        )
+        if cacheable and isinstance(output, dict) and output.get("status") != "error":
+            self.results.set(node_hash, output)
+        return output
+
+    @staticmethod
+    async def _execute(agent: BaseAgent, node_inputs: Any, on_token: Optional[TokenCallback]) -> Any:
+        if on_token is not None:
+            return await agent.execute(node_inputs, on_token=on_token)
+        return await agent.execute(node_inputs)
+
+    async def _assemble(
+        self,
+        graph: WorkflowGraph,
+        name: str,
+        context: Dict[str, Any],
+        listener: Optional[EventListener]
+    ) -> Tuple[Any, Dict[str, Dict[str, Any]]]:
+        """Resolve a node's inputs with its budgeted slots cut down to their token budgets"""
+        node = graph.nodes[name]
+        budget = graph.prompt_budgets[name]
+        try:
+            count_tokens = (await self.agents.get(node.get("agent_type"))).count_tokens
+        except Exception as e:
+            # The node fails on the same error when it runs; estimate so its inputs still resolve
+            logger.error(f"No tokenizer for workflow node {name}: {str(e)}")
+            count_tokens = prompt_assembly.estimate_tokens
+        query = _to_text(resolve_inputs(budget.query, context))
+        reports: Dict[str, Dict[str, Any]] = {}
+
+        def fit(reference: Reference, value: Any) -> Optional[str]:
+            tokens = budget.slots.get(reference)
+            if tokens is None:
+                return None
+            text, report = prompt_assembly.fit(value, query, tokens, count_tokens)
+            reports[".".join((reference[0],) + reference[1])] = report
+            return text
+
+        # Tokenizing whole pages and files is CPU work, keep it off the event loop
+        node_inputs = await asyncio.to_thread(resolve_inputs, graph.inputs[name], context, fit)
+        for slot, report in reports.items():
+            prompt_context_tokens.inc(report["kept_tokens"], node=name, slot=slot, kind="kept")
+            prompt_context_tokens.inc(report["dropped_tokens"], node=name, slot=slot, kind="dropped")
+            if report["dropped_tokens"]:
+                logger.info(
+                    f"Workflow node {name}: {slot} cut to {report['kept_tokens']}/{report['tokens']} tokens "
+                    f"({report['kept_passages']}/{report['passages']} passages)"
+                )
+        _notify(listener, {"type": "context", "node": name, "slots": reports})
+        return node_inputs, reports
+
+    def _budget(self, node: Mapping[str, Any], deadline: Optional[float]) -> Optional[float]:
+        budgets = [node.get("timeout", self.node_timeout)]
+        if deadline is not None:
+            budgets.append(deadline - time.monotonic())
+        budgets = [budget for budget in budgets if budget is not None]
+        return min(budgets) if budgets else None
+
+    def _critical_path(self, graph: WorkflowGraph, results: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Walk back from the last node to finish through the dependency that finished last"""
+        timed = {name: r["timing"] for name, r in results.items() if r.get("timing")}
+        if not timed:
+            return []
+        current: Optional[str] = max(timed, key=lambda name: timed[name]["end"])
+        path = []
+        while current:
+            path.append(current)
+            deps = [dep for dep in graph.dependencies[current] if dep in timed]
+            current = max(deps, key=lambda dep: timed[dep]["end"]) if deps else None
+        return list(reversed(path))
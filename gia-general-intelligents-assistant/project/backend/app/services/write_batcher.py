@@ -0,0 +1,134 @@
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import time
+from loguru import logger
+from sqlalchemy import delete, insert, update
+from ..models.database import async_session
+from .metrics import metrics
+
+db_rows_written = metrics.counter("gia_db_rows_written_total", "Rows updated by batched writes")
+db_flush_seconds = metrics.histogram("gia_db_flush_seconds", "Duration of batched write transactions")
+
+
+class WriteBatcher:
+    """Merges frequent small row updates into a few batched transactions.
+
+    Updates wait at most flush_interval seconds (or until max_batch rows are pending)
+    and are then written together in one transaction; several updates of the same row
+    in that window collapse into one. Callers are resumed once their update is committed,
+    so a write that returns is durable.
+
+    replace() writes a whole row, inserting it if it does not exist; rows replaced and
+    updated in the same window are committed in the same transaction, replaced rows first.
+    """
+
+    def __init__(self, session_factory=async_session, flush_interval: float = 0.05, max_batch: int = 500):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.stats = {"updates": 0, "rows": 0, "transactions": 0, "flush_time": 0.0, "errors": 0}
+        # (model, primary key) -> (values, future, whether the whole row is replaced)
+        self._pending: Dict[Tuple[type, Any], Tuple[Dict[str, Any], asyncio.Future, bool]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._full: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def update(self, model: type, key: Any, values: Dict[str, Any]):
+        """Set columns of the row of `model` with primary key `key`"""
+        await self._queue(model, key, values, False)
+
+    async def replace(self, model: type, key: Any, values: Dict[str, Any]):
+        """Write the row of `model` with primary key `key`, replacing any existing one"""
+        await self._queue(model, key, values, True)
+
+    async def _queue(self, model: type, key: Any, values: Dict[str, Any], replace: bool):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = {}
+            self._full = asyncio.Event()
+            self._flusher = None
+
+        self.stats["updates"] += 1
+        entry = self._pending.get((model, key))
+        if entry is not None:
+            merged = {**entry[0], **values} if not replace else dict(values)
+            future = entry[1]
+            self._pending[(model, key)] = (merged, future, entry[2] or replace)
+        else:
+            future = loop.create_future()
+            self._pending[(model, key)] = (dict(values), future, replace)
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        if self._flusher is None or self._flusher.done():
+            self._flusher = loop.create_task(self._flush_soon())
+        # Shielded so a cancelled caller does not fail the batch its update is part of
+        await asyncio.shield(future)
+
+    async def _flush_soon(self):
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            batch, self._pending = self._pending, {}
+            await self._write(batch)
+
+    async def _write(self, batch: Dict[Tuple[type, Any], Tuple[Dict[str, Any], asyncio.Future, bool]]):
+        rows: Dict[type, List[Dict[str, Any]]] = {}
+        replaced: Dict[type, List[Dict[str, Any]]] = {}
+        for (model, key), (values, _, replace) in batch.items():
+            primary_key = model.__mapper__.primary_key[0].key
+            (replaced if replace else rows).setdefault(model, []).append({primary_key: key, **values})
+
+        started = time.perf_counter()
+        try:
+            async with self.session_factory() as session:
+                for model, model_rows in replaced.items():
+                    primary_key = model.__mapper__.primary_key[0]
+                    await session.execute(
+                        delete(model).where(primary_key.in_([row[primary_key.key] for row in model_rows]))
+                    )
+                    await session.execute(insert(model), model_rows)
+                for model, model_rows in rows.items():
+                    # Rows with the same set of columns are sent as one executemany
+                    by_columns: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+                    for row in model_rows:
+                        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+                    for group in by_columns.values():
+                        await session.execute(update(model), group)
+                await session.commit()
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Batched write of {len(batch)} rows failed: {str(e)}")
+            for _, future, _ in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        self.stats["rows"] += len(batch)
+        self.stats["transactions"] += 1
+        self.stats["flush_time"] += elapsed
+        db_rows_written.inc(len(batch))
+        db_flush_seconds.observe(elapsed)
+        for _, future, _ in batch.values():
+            if not future.done():
+                future.set_result(None)
+
+    async def flush(self):
+        """Wait until every update queued so far is committed"""
+        if self._flusher is not None and not self._flusher.done():
+            self._full.set()
+            await asyncio.shield(self._flusher)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "pending": len(self._pending),
+            "rows_per_transaction": self.stats["rows"] / self.stats["transactions"] if self.stats["transactions"] else 0.0
+        }
+
+
+write_batcher = WriteBatcher()
@@ -0,0 +1,130 @@
+"""Measure step-update throughput with many tasks writing concurrently.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_db_writes [--tasks N] [--steps N] [--output-bytes N] [--url URL]
+
+Each simulated task marks its steps running and then completed with an output, as the
+task processor does. Three setups are compared: one transaction per update on an
+untuned SQLite connection (rollback journal), the same with WAL and the pragmas of
+app.models.database, and WAL with updates merged by WriteBatcher. Without --url each
+setup uses a fresh temporary SQLite file.
+"""
+from typing import Callable, List
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models.database import Base, make_engine
+from app.models.task import Task, TaskStep
+from app.services.write_batcher import WriteBatcher
+
+
+async def create_tasks(session_factory, tasks: int, steps: int) -> List[List[str]]:
+    now = datetime.utcnow()
+    step_ids = []
+    async with session_factory() as session:
+        for _ in range(tasks):
+            task_id = str(uuid.uuid4())
+            task = Task(id=task_id, description="benchmark", status="processing", created_at=now, updated_at=now)
+            task.steps = [
+                TaskStep(id=str(uuid.uuid4()), task_id=task_id, name=f"Step {i}", type=f"step_{i}", position=i)
+                for i in range(steps)
+            ]
+            session.add(task)
+            step_ids.append([step.id for step in task.steps])
+        await session.commit()
+    return step_ids
+
+
+def per_write(session_factory) -> Callable:
+    async def write(step_id: str, values: dict):
+        async with session_factory() as session:
+            await session.execute(
+                update(TaskStep).where(TaskStep.id == step_id).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+    return write
+
+
+def batched(session_factory) -> Callable:
+    batcher = WriteBatcher(session_factory)
+
+    async def write(step_id: str, values: dict):
+        await batcher.update(TaskStep, step_id, values)
+    write.batcher = batcher
+    return write
+
+
+async def run_task(write: Callable, step_ids: List[str], output: str, latencies: List[float]):
+    for step_id in step_ids:
+        for values in ({"status": "running"}, {"status": "completed", "output": output, "input_hash": "0" * 64}):
+            # Node work between updates, so writes from different tasks interleave
+            await asyncio.sleep(random.uniform(0, 0.005))
+            started = time.perf_counter()
+            await write(step_id, values)
+            latencies.append(time.perf_counter() - started)
+
+
+async def run_setup(name: str, url: str, tune: bool, make_writer: Callable, args) -> None:
+    engine = make_engine(url, tune=tune)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    step_ids = await create_tasks(session_factory, args.tasks, args.steps)
+
+    write = make_writer(session_factory)
+    output = "x" * args.output_bytes
+    latencies: List[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_task(write, ids, output, latencies) for ids in step_ids))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    latencies.sort()
+    extra = ""
+    if hasattr(write, "batcher"):
+        extra = f" {write.batcher.get_stats()['rows_per_transaction']:>6.1f} rows/txn"
+    print(
+        f"{name:<24} {len(latencies) / elapsed:>9.0f} writes/s  "
+        f"p50 {statistics.median(latencies) * 1000:>7.1f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:>7.1f} ms{extra}"
+    )
+
+
+async def main_async(args):
+    setups = [
+        ("per-write, rollback", False, per_write),
+        ("per-write, WAL", True, per_write),
+        ("batched, WAL", True, batched),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for index, (name, tune, make_writer) in enumerate(setups):
+            url = args.url or f"sqlite+aiosqlite:///{os.path.join(directory, f'bench{index}.db')}"
+            if args.url and not tune:
+                continue
+            await run_setup(name, url, tune, make_writer, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=300)
+    parser.add_argument("--steps", type=int, default=7)
+    parser.add_argument("--output-bytes", type=int, default=2048)
+    parser.add_argument("--url", help="database URL to benchmark instead of temporary SQLite files")
+    args = parser.parse_args()
+    print(f"{args.tasks} concurrent tasks x {args.steps} steps x 2 updates")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare HTML extraction throughput of the BeautifulSoup baseline and extract_html.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_html_extract [CORPUS_DIR] [--workers N] [--repeat N]
+
+CORPUS_DIR holds saved pages (*.html / *.htm). Without it a synthetic corpus of
+documentation-like pages of various sizes is generated.
+"""
+from typing import Callable, Dict, List
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+
+from app.services.agents.html_extract import extract_html
+
+
+def bs4_extract(html: str) -> Dict[str, str]:
+    """The scraper's original extraction: full tree with html.parser, then get_text"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title else ""
+    main_content = soup.find("main") or soup.find("article") or soup.find("body")
+    text_content = main_content.get_text(strip=True) if main_content else ""
+    return {"title": title, "content": text_content}
+
+
+def synthetic_corpus() -> List[str]:
+    pages = []
+    for sections in (5, 50, 500, 2000):
+        nav = "".join(f'<li><a href="/p{i}">Page {i}</a></li>' for i in range(200))
+        body = "".join(
+            f"<h2>Section {i}</h2><p>Some <b>documentation</b> text for section {i} with "
+            f"<a href='#'>links</a> and <code>inline_code()</code>.</p>"
+            f"<pre>def example_{i}():\n    return {i}</pre>"
+            for i in range(sections)
+        )
+        footer = "<p>Related content</p>" * sections
+        pages.append(
+            f"<html><head><title>Docs {sections}</title><script>var x = 1;</script></head>"
+            f"<body><nav><ul>{nav}</ul></nav><main>{body}</main><footer>{footer}</footer></body></html>"
+        )
+    return pages
+
+
+def load_corpus(path: str) -> List[str]:
+    pages = []
+    for name in sorted(glob.glob(os.path.join(path, "*.htm*"))):
+        with open(name, "rb") as f:
+            pages.append(f.read().decode("utf-8", errors="replace"))
+    return pages
+
+
+def run_serial(extract: Callable, pages: List[str], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            extract(page)
+    return time.perf_counter() - started
+
+
+def run_pool(pages: List[str], repeat: int, workers: int) -> float:
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        list(pool.map(extract_html, pages[:workers]))  # start the workers before timing
+        started = time.perf_counter()
+        list(pool.map(extract_html, pages * repeat, chunksize=1))
+        return time.perf_counter() - started
+
+
+def report(name: str, elapsed: float, pages: int, total_bytes: int):
+    print(f"{name:<28} {pages / elapsed:>10.1f} pages/s {total_bytes / elapsed / 2**20:>10.1f} MiB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", help="directory of saved HTML pages")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else synthetic_corpus()
+    if not pages:
+        parser.error(f"No HTML pages found in {args.corpus}")
+    total_pages = len(pages) * args.repeat
+    total_bytes = sum(len(page.encode()) for page in pages) * args.repeat
+    print(f"{len(pages)} pages, {total_bytes / args.repeat / 2**20:.1f} MiB, repeated {args.repeat}x")
+
+    try:
+        report("beautifulsoup (baseline)", run_serial(bs4_extract, pages, args.repeat), total_pages, total_bytes)
+    except ImportError:
+        print("beautifulsoup4 is not installed; skipping the baseline")
+    report("extract_html", run_serial(extract_html, pages, args.repeat), total_pages, total_bytes)
+    report(f"extract_html x{args.workers} procs", run_pool(pages, args.repeat, args.workers), total_pages, total_bytes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Load time, memory and generation speed of the LLM load modes on this machine.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_llm_load [--model NAME | --model-path DIR] [--modes MODE,...]
+        [--mmap] [--threads N] [--interop-threads N] [--new-tokens N] [--runs N] [--output PATH]
+
+Each mode is loaded in a fresh process, so load time and resident memory are not
+flattered by an earlier load. A small local checkpoint (e.g. a tiny GPT-2 or Llama
+saved with save_pretrained(..., safe_serialization=True)) makes a quick smoke test;
+run it with the production model on each node type to pick LLM_LOAD_MODE, LLM_MMAP
+and LLM_TORCH_THREADS for that machine.
+"""
+from typing import Any, Dict, List
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+
+PROMPT = "<s>[INST] Write a Python function that returns the n-th Fibonacci number. [/INST]"
+
+
+def measure(args, mode: str) -> Dict[str, Any]:
+    # Runs in the child process: torch and the model are imported only here
+    import torch
+    from app.services.agents.model_loader import configure_threads, load_model
+    from app.services.agents.registry import resident_memory
+
+    configure_threads(args.threads, args.interop_threads)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokenizer, model, stats = load_model(args.model_path or args.model, device, mode, args.mmap, args.cache_dir)
+
+    inputs = tokenizer(PROMPT, return_tensors="pt").to(device)
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    rates: List[float] = []
+    with torch.inference_mode():
+        # The first generation includes one-off kernel and allocator setup
+        model.generate(**inputs, max_new_tokens=1, do_sample=False, pad_token_id=pad_token_id)
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            outputs = model.generate(
+                **inputs, max_new_tokens=args.new_tokens, min_new_tokens=args.new_tokens,
+                do_sample=False, pad_token_id=pad_token_id
+            )
+            generated = outputs.shape[1] - inputs["input_ids"].shape[1]
+            rates.append(generated / (time.perf_counter() - started))
+
+    stats.update({
+        "resident_bytes": resident_memory(),
+        "tokens_per_second": sorted(rates)[len(rates) // 2],
+        "sample": tokenizer.decode(outputs[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)[:80]
+    })
+    return stats
+
+
+def _child(args, mode: str, results):
+    try:
+        results.put(measure(args, mode))
+    except Exception as e:
+        results.put({"mode": mode, "error": str(e)})
+
+
+def run_mode(args, mode: str) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_child, args=(args, mode, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def print_report(reports: List[Dict[str, Any]]):
+    print(f"{'mode':<10} {'dtype':<9} {'mmap':<5} {'load s':>8} {'+RSS GiB':>9} {'RSS GiB':>8} {'tokens/s':>9}")
+    for report in reports:
+        if "error" in report:
+            print(f"{report['mode']:<10} failed: {report['error']}")
+            continue
+        print(
+            f"{report['mode']:<10} {report['dtype']:<9} {'yes' if report['mmap'] else 'no':<5} "
+            f"{report['load_time']:>8.2f} {report['memory_bytes'] / 2**30:>9.2f} "
+            f"{report['resident_bytes'] / 2**30:>8.2f} {report['tokens_per_second']:>9.2f}"
+        )
+
+
+def main():
+    from app.services.agents.llm_agent import DEFAULT_MODEL
+    from app.services.agents.model_loader import LOAD_MODES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--model-path", help="local checkpoint directory, used instead of --model")
+    parser.add_argument("--cache-dir", help="download cache for --model")
+    parser.add_argument("--modes", default="float32,bfloat16,int8", help=f"comma-separated, of {', '.join(LOAD_MODES)}")
+    parser.add_argument("--mmap", action="store_true", help="memory-map safetensors weights")
+    parser.add_argument("--threads", type=int, help="torch intra-op threads (default: torch's choice)")
+    parser.add_argument("--interop-threads", type=int)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3, help="generations per mode; the median rate is reported")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in LOAD_MODES]
+    if unknown:
+        parser.error(f"Unknown load modes: {', '.join(unknown)}")
+
+    reports = []
+    for mode in modes:
+        print(f"Loading {args.model_path or args.model} as {mode}...", file=sys.stderr)
+        reports.append(run_mode(args, mode))
+    print_report(reports)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2, sort_keys=True)
+            f.write("\n")
+    if any("error" in report for report in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""End-to-end throughput of the task pipeline with stub agents.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_pipeline [--rate R] [--tasks N] [--concurrency N]
+        [--latency AGENT=DIST ...] [--seed N] [--url URL] [--baseline PATH] [--save-baseline]
+
+Tasks are submitted through POST /tasks/ of the FastAPI app, driven in-process, at
+an open-loop Poisson rate of R tasks/s. They run through the queue, the in-process
+worker, TaskProcessor and WorkflowEngine on the stub agents of benchmarks.stub_agents,
+and are committed to the database (a temporary SQLite file without --url).
+
+Reported: completed tasks/s, p50/p99 end-to-end latency (submission to the final
+commit, from the tasks' timestamps), and the step write rate of the write batcher.
+The results are compared with a stored baseline of the same configuration; the run
+exits with status 1 when a metric is worse than the baseline by more than
+--tolerance. Baselines depend on the machine; refresh them with --save-baseline.
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "bench_pipeline.json")
+
+# Metric name -> True when higher is better
+COMPARED_METRICS = {
+    "tasks_per_second": True,
+    "latency_p50": False,
+    "latency_p99": False,
+    "step_writes_per_second": True,
+}
+
+
+async def submit(client, results: Dict[str, Any], index: int):
+    response = await client.post("/tasks/", json={"description": f"Benchmark task {index}", "status": "pending"})
+    if response.status_code == 202:
+        results["submitted"].append(response.json()["id"])
+    elif response.status_code == 429:
+        results["rejected"] += 1
+    else:
+        results["errors"] += 1
+
+
+async def wait_until_drained(client, timeout: float, interval: float = 0.2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get(
+            "/tasks/", params={"status": ["pending", "processing"], "limit": 1, "include_outputs": "false"}
+        )
+        if not response.json():
+            return
+        await asyncio.sleep(interval)
+    raise TimeoutError(f"Tasks still running after {timeout:.0f}s")
+
+
+async def run_load(args) -> Dict[str, Any]:
+    # Imported here: the app reads its database and worker settings from the environment on import
+    import httpx
+    from sqlalchemy import select
+    from app.main import app
+    from app.models.database import async_session
+    from app.models.task import Task
+    from app.services.agents.registry import agent_registry
+    from app.services.write_batcher import write_batcher
+    from benchmarks.stub_agents import register_stub_agents
+
+    register_stub_agents(agent_registry, args.latencies, args.seed)
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            writes_before = dict(write_batcher.stats)
+            results: Dict[str, Any] = {"submitted": [], "rejected": 0, "errors": 0}
+            arrivals = random.Random(args.seed)
+            submissions = []
+            started = time.perf_counter()
+            next_at = 0.0
+            for index in range(args.tasks):
+                next_at += arrivals.expovariate(args.rate)
+                delay = started + next_at - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                submissions.append(asyncio.create_task(submit(client, results, index)))
+            await asyncio.gather(*submissions)
+            await wait_until_drained(client, args.timeout)
+            await write_batcher.flush()
+            elapsed = time.perf_counter() - started
+
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(Task.status, Task.created_at, Task.updated_at).where(Task.id.in_(results["submitted"]))
+            )).all()
+    finally:
+        await app.router.shutdown()
+
+    completed = [row for row in rows if row.status == "completed"]
+    latencies = sorted((row.updated_at - row.created_at).total_seconds() for row in completed)
+    span = (
+        (max(row.updated_at for row in completed) - min(row.created_at for row in completed)).total_seconds()
+        if completed else 0.0
+    )
+    step_writes = write_batcher.stats["rows"] - writes_before["rows"]
+    transactions = write_batcher.stats["transactions"] - writes_before["transactions"]
+    return {
+        "submitted": len(results["submitted"]),
+        "rejected": results["rejected"],
+        "errors": results["errors"],
+        "completed": len(completed),
+        "failed": len(rows) - len(completed),
+        "tasks_per_second": len(completed) / span if span else 0.0,
+        "latency_p50": statistics.median(latencies) if latencies else 0.0,
+        "latency_p99": latencies[max(int(len(latencies) * 0.99) - 1, 0)] if latencies else 0.0,
+        "step_writes_per_second": step_writes / elapsed,
+        "write_transactions_per_second": transactions / elapsed,
+    }
+
+
+def configuration(args) -> Dict[str, Any]:
+    from benchmarks.stub_agents import DEFAULT_LATENCIES
+    return {
+        "rate": args.rate,
+        "tasks": args.tasks,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "latencies": {**DEFAULT_LATENCIES, **args.latencies},
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print each metric next to its baseline value; return the metrics that regressed"""
+    regressions = []
+    for name, higher_is_better in COMPARED_METRICS.items():
+        current, previous = report[name], baseline["results"].get(name)
+        if not previous:
+            continue
+        change = (current - previous) / previous
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<24} {current:>10.3f}  baseline {previous:>10.3f}  {change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    print(
+        f"{report['completed']} completed, {report['failed']} failed, "
+        f"{report['rejected']} rejected, {report['errors']} errors"
+    )
+    print(f"  throughput  {report['tasks_per_second']:>8.2f} tasks/s")
+    print(f"  latency     p50 {report['latency_p50'] * 1000:>8.0f} ms   p99 {report['latency_p99'] * 1000:>8.0f} ms")
+    print(
+        f"  DB writes   {report['step_writes_per_second']:>8.1f} step rows/s in "
+        f"{report['write_transactions_per_second']:.1f} transactions/s"
+    )
+
+
+def parse_latency(value: str):
+    agent_type, _, spec = value.partition("=")
+    from benchmarks.stub_agents import STUB_AGENTS, LatencyModel
+    if agent_type not in STUB_AGENTS:
+        raise argparse.ArgumentTypeError(f"Unknown agent: {agent_type}")
+    try:
+        LatencyModel(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return agent_type, spec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Below the stub pipeline's capacity at the default concurrency: an overloaded queue makes latency noisy
+    parser.add_argument("--rate", type=float, default=8, help="task submissions per second")
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16, help="tasks the worker runs at once")
+    parser.add_argument(
+        "--latency", type=parse_latency, action="append", default=[], metavar="AGENT=DIST",
+        help="latency distribution of a stub agent, e.g. llm=lognormal:0.2:0.3"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="database URL to use instead of a temporary SQLite file")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for submitted tasks")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before failing")
+    args = parser.parse_args()
+    args.latencies = dict(args.latency)
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = args.url or f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        os.environ["TASK_WORKERS"] = "0"
+        os.environ["TASK_CONCURRENCY"] = str(args.concurrency)
+        os.environ["MAX_QUEUE_DEPTH"] = str(max(args.tasks, 100))
+        print(f"{args.tasks} tasks at {args.rate:g}/s, worker concurrency {args.concurrency}")
+        report = asyncio.run(run_load(args))
+    print_report(report)
+
+    config = configuration(args)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({"config": config, "results": report}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; store one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["config"] != config:
+        print("Baseline was recorded with a different configuration; not comparing")
+        return
+    print("Compared with baseline:")
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Deterministic stand-ins for the agents, for benchmarking the pipeline without a GPU
+model, Docker or network access.
+
+Each stub sleeps for a latency drawn from its distribution and returns output of the
+same shape as the real agent, so the default workflow's references resolve. Latencies
+are drawn from a generator seeded with the benchmark seed, the agent and its inputs:
+a given task sees the same latencies in every run, however calls interleave.
+
+Latency distributions are written as `fixed:SECONDS`, `uniform:LOW:HIGH` or
+`lognormal:MEDIAN:SIGMA`.
+"""
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import math
+import random
+
+from app.services.agents.base_agent import BaseAgent
+from app.services.agents.registry import AgentRegistry
+
+DEFAULT_LATENCIES = {
+    "llm": "lognormal:0.2:0.3",
+    "scraper": "lognormal:0.1:0.5",
+    "github": "lognormal:0.15:0.4",
+    "code_execution": "lognormal:0.05:0.3",
+}
+
+
+class LatencyModel:
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        values = [float(param) for param in params]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}.get(kind)
+        if expected is None or len(values) != expected:
+            raise ValueError(f"Invalid latency distribution: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.params = values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma)
+
+
+class StubAgent(BaseAgent):
+    agent_type = ""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        super().__init__(config)
+        self.latency = LatencyModel(self.config.get("latency", DEFAULT_LATENCIES[self.agent_type]))
+        self.seed = self.config.get("seed", 0)
+        self.calls = 0
+
+    def _rng(self, task_input: Dict[str, Any]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(task_input, sort_keys=True, default=str).encode()).hexdigest()
+        return random.Random(f"{self.seed}:{self.agent_type}:{digest}")
+
+    async def _work(self, task_input: Dict[str, Any]) -> random.Random:
+        rng = self._rng(task_input)
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample(rng))
+        return rng
+
+    def get_status(self) -> Dict[str, Any]:
+        status = super().get_status()
+        status.update({"latency": self.latency.spec, "calls": self.calls})
+        return status
+
+
+class StubLLMAgent(StubAgent):
+    agent_type = "llm"
+    supports_streaming = True
+
+    async def execute(
+        self,
+        task_input: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
+        prompt = task_input.get("prompt", "")
+        if not prompt:
+            return {"status": "error", "error": "No prompt provided"}
+        rng = await self._work(task_input)
+        words = [f"token{rng.randrange(1000)}" for _ in range(rng.randint(20, 80))]
+        if on_token is not None:
+            for word in words:
+                on_token(word + " ")
+        return {"status": "success", "response": " ".join(words), "model": "stub", "device": "cpu"}
+
+
+class StubScraperAgent(StubAgent):
+    agent_type = "scraper"
+
+    async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
+        rng = await self._work(task_input)
+        results = []
+        for index in range(rng.randint(1, 3)):
+            chunks = []
+            for section in range(rng.randint(3, 20)):
+                chunks.append({"type": "heading", "text": f"Section {section}"})
+                chunks.append({"type": "text", "text": " ".join(
+                    f"word{rng.randrange(500)}" for _ in range(rng.randint(20, 120))
+                )})
+            results.append({
+                "url": f"https://example.com/page{rng.randrange(10000)}",
+                "status": "success",
+                "content": {
+                    "title": f"Page {index}",
+                    "content": "\n\n".join(chunk["text"] for chunk in chunks),
+                    "chunks": chunks,
+                    "metadata": {"status_code": 200, "cache": "miss"}
+                }
+            })
+        return {"results": results}
+
+
+class StubGitHubAgent(StubAgent):
+    agent_type = "github"
+
+    async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
+        rng = await self._work(task_input)
+        samples = [
+            {
+                "repository": f"repo{rng.randrange(1000)}",
+                "file_name": f"module{index}.py",
+                "code": "".join(
+                    f"def function_{n}(value):\n    return value * {rng.randrange(100)}\n\n"
+                    for n in range(rng.randint(5, 40))
+                ),
+                "url": f"https://github.com/example/repo/blob/main/module{index}.py",
+                "truncated": False
+            }
+            for index in range(rng.randint(1, 5))
+        ]
+        return {"status": "success", "code_samples": samples}
+
+
+class StubCodeExecutionAgent(StubAgent):
+    agent_type = "code_execution"
+
+    async def execute(self, task_input: Dict[str, Any]) -> Dict[str, Any]:
+        if not task_input.get("code"):
+            return {"status": "error", "error": "No code provided"}
+        await self._work(task_input)
+        return {
+            "status": "success",
+            "result": {"output": "ok\n", "exit_status": "success", "exit_code": 0},
+            "language": task_input.get("language", "python")
+        }
+
+
+STUB_AGENTS = {
+    cls.agent_type: cls for cls in (StubLLMAgent, StubScraperAgent, StubGitHubAgent, StubCodeExecutionAgent)
+}
+
+
+def register_stub_agents(registry: AgentRegistry, latencies: Optional[Dict[str, str]] = None, seed: int = 0):
+    """Replace the real agents in `registry` with stubs"""
+    latencies = {**DEFAULT_LATENCIES, **(latencies or {})}
+    for agent_type, cls in STUB_AGENTS.items():
+        registry.register(agent_type, cls, {"latency": latencies[agent_type], "seed": seed})
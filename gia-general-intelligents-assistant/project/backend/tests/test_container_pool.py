@@ -0,0 +1,112 @@
+import asyncio
+import os
+import pytest
+from app.services.agents.container_pool import ContainerPool, LocalProcessBackend, parse_run_output
+
+
+async def settle(pool: ContainerPool):
+    # Let background starts and removals finish before checking the pool
+    while pool._background:
+        await asyncio.gather(*pool._background, return_exceptions=True)
+
+
+def test_recycled_sandbox_is_reused_and_wiped():
+    async def scenario():
+        backend = LocalProcessBackend()
+        pool = ContainerPool(backend, min_size=1, max_size=2, recycle=True)
+        await pool.start()
+        try:
+            async with pool.lease() as first:
+                result = await asyncio.to_thread(backend.run, first, "print('hello')", "main.py", 5)
+                assert parse_run_output(result["output"], result["exit_code"], 0)["output"].strip() == "hello"
+            await settle(pool)
+            async with pool.lease() as second:
+                assert second == first
+                assert os.listdir(second) == []
+            assert pool.stats["warm_leases"] == 2
+        finally:
+            await pool.close()
+        assert not os.path.exists(first)
+
+    asyncio.run(scenario())
+
+
+def test_failed_lease_replaces_sandbox():
+    async def scenario():
+        pool = ContainerPool(LocalProcessBackend(), min_size=1, max_size=1, recycle=True)
+        await pool.start()
+        try:
+            with pytest.raises(RuntimeError):
+                async with pool.lease() as failed:
+                    raise RuntimeError("snippet crashed the sandbox")
+            await settle(pool)
+            assert not os.path.exists(failed)
+            assert pool.size == pool.idle == 1
+            async with pool.lease() as replacement:
+                assert replacement != failed
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_used_sandbox_is_destroyed_without_recycling():
+    async def scenario():
+        pool = ContainerPool(LocalProcessBackend(), min_size=1, max_size=1)
+        await pool.start()
+        try:
+            async with pool.lease() as used:
+                pass
+            await settle(pool)
+            assert not os.path.exists(used)
+            assert pool.stats["destroyed"] == 1
+            assert pool.size == pool.idle == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
+
+
+def test_checkout_waits_when_pool_is_full():
+    async def scenario():
+        pool = ContainerPool(LocalProcessBackend(), min_size=0, max_size=2, recycle=True)
+        try:
+            first = await pool.acquire()
+            second = await pool.acquire()
+            third = asyncio.ensure_future(pool.acquire())
+            await asyncio.sleep(0.1)
+            assert not third.done()
+            assert pool.size == 2 and pool.stats["waits"] == 1
+
+            await pool.release(first)
+            assert await asyncio.wait_for(third, timeout=5) == first
+            assert pool.size == 2
+            await pool.release(second)
+            await pool.release(first)
+        finally:
+            await pool.close()
+        assert pool.stats["created"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_idle_sandboxes_are_stopped_without_further_releases():
+    async def scenario():
+        pool = ContainerPool(LocalProcessBackend(), min_size=1, max_size=3, idle_timeout=0.2, recycle=True)
+        await pool.start()
+        try:
+            leased = [await pool.acquire() for _ in range(3)]
+            for container in leased:
+                await pool.release(container)
+            await settle(pool)
+            assert pool.size == pool.idle == 3
+
+            # No lease is released from here on; the reaper alone shrinks the pool
+            await asyncio.sleep(0.6)
+            await settle(pool)
+            assert pool.size == pool.idle == 1
+            assert sum(os.path.exists(container) for container in leased) == 1
+        finally:
+            await pool.close()
+
+    asyncio.run(scenario())
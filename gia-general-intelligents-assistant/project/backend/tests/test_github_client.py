@@ -0,0 +1,129 @@
+import asyncio
+import time
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+from aiohttp.test_utils import TestServer
+from app.services import deadline as deadlines
+from app.services.agents.github_client import AsyncGitHubClient, GitHubAPIError
+
+
+async def serve(handler, path="/repos/{owner}/{repo}/contents/{path:.*}"):
+    app = web.Application()
+    app.router.add_get(path, handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def rate_headers(remaining: int, reset_in: float, limit: int = 60):
+    return {
+        "X-RateLimit-Resource": "core",
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(time.time() + reset_in)
+    }
+
+
+def test_requests_are_spread_when_the_budget_is_low():
+    started = []
+
+    async def handler(request):
+        started.append(time.monotonic())
+        # 4 of 100 left, resetting in 0.4s: one request per 0.1s
+        return web.json_response([], headers=rate_headers(4, 0.4, limit=100))
+
+    async def scenario():
+        server = await serve(handler)
+        client = AsyncGitHubClient(base_url=str(server.make_url("")))
+        try:
+            for _ in range(3):
+                await client.get_contents("octo/repo")
+        finally:
+            await client.close()
+            await server.close()
+
+    asyncio.run(scenario())
+    gaps = [later - earlier for earlier, later in zip(started, started[1:])]
+    assert all(gap >= 0.05 for gap in gaps)
+
+
+@pytest.mark.parametrize("status", [403, 429])
+def test_rate_limited_request_is_retried_after_retry_after(status):
+    responses = []
+
+    async def handler(request):
+        if not responses:
+            responses.append(status)
+            return web.json_response({"message": "slow down"}, status=status, headers={"Retry-After": "1"})
+        responses.append(200)
+        return web.json_response([{"name": "a.py", "type": "file"}])
+
+    async def scenario():
+        server = await serve(handler)
+        client = AsyncGitHubClient(base_url=str(server.make_url("")))
+        try:
+            started = time.monotonic()
+            contents = await client.get_contents("octo/repo")
+            return contents, time.monotonic() - started, client.stats
+        finally:
+            await client.close()
+            await server.close()
+
+    contents, elapsed, stats = asyncio.run(scenario())
+    assert contents == [{"name": "a.py", "type": "file"}]
+    assert responses == [status, 200]
+    assert elapsed >= 1
+    assert stats["rate_limited"] == 1
+
+
+def test_wait_for_a_distant_reset_is_bounded():
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path)
+        return web.json_response({"message": "rate limited"}, status=403, headers=rate_headers(0, 3600))
+
+    async def scenario():
+        server = await serve(handler)
+        client = AsyncGitHubClient(base_url=str(server.make_url("")), max_rate_limit_wait=5)
+        try:
+            started = time.monotonic()
+            with pytest.raises(GitHubAPIError):
+                await client.get_contents("octo/repo")
+            # The limiter now knows the budget is spent, so the next call fails before sending
+            with deadlines.scope(10), pytest.raises(GitHubAPIError):
+                await asyncio.wait_for(client.get_contents("octo/other"), timeout=5)
+            return time.monotonic() - started
+        finally:
+            await client.close()
+            await server.close()
+
+    assert asyncio.run(scenario()) < 1
+    assert hits == ["/repos/octo/repo/contents/"]
+
+
+def test_concurrent_fetches_stay_under_the_connection_limit():
+    in_flight = {"now": 0, "peak": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            await asyncio.sleep(0.05)
+            return web.json_response([{"name": request.match_info["repo"]}])
+        finally:
+            in_flight["now"] -= 1
+
+    async def scenario():
+        server = await serve(handler)
+        client = AsyncGitHubClient(base_url=str(server.make_url("")), max_concurrency=2)
+        try:
+            return await asyncio.gather(*(client.get_contents(f"octo/repo{n}") for n in range(6)))
+        finally:
+            await client.close()
+            await server.close()
+
+    results = asyncio.run(scenario())
+    assert [listing[0]["name"] for listing in results] == [f"repo{n}" for n in range(6)]
+    assert in_flight["peak"] == 2
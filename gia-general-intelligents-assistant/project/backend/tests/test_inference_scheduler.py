@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from app.services.agents.inference_scheduler import InferenceScheduler
+
+PAD = 0
+
+
+class CharTokenizer:
+    """One token per character, id = code point; 0 pads"""
+    eos_token = "\0"
+    pad_token = None
+    pad_token_id = PAD
+    padding_side = "right"
+
+    def __call__(self, prompts, return_tensors="pt", padding=False):
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        width = max(len(prompt) for prompt in prompts)
+        # Left padding, as the scheduler configures
+        ids = [[PAD] * (width - len(prompt)) + [ord(c) for c in prompt] for prompt in prompts]
+        mask = [[0] * (width - len(prompt)) + [1] * len(prompt) for prompt in prompts]
+        return transformers.BatchEncoding({"input_ids": torch.tensor(ids), "attention_mask": torch.tensor(mask)})
+
+    def decode(self, ids, skip_special_tokens=False):
+        ids = ids.tolist() if hasattr(ids, "tolist") else ids
+        return "".join(chr(i) for i in ids if i != PAD)
+
+    def batch_decode(self, rows, skip_special_tokens=False):
+        return [self.decode(row, skip_special_tokens) for row in rows]
+
+
+class UppercaseModel:
+    """Answers each prompt with itself upper-cased, one token per step, like generate()"""
+
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, input_ids, attention_mask, pad_token_id, stopping_criteria=None, streamer=None, **params):
+        self.batches.append(len(input_ids))
+        answers = [
+            [ord(chr(i).upper()) for i, keep in zip(row.tolist(), mask.tolist()) if keep]
+            for row, mask in zip(input_ids, attention_mask)
+        ]
+        steps = max(len(answer) for answer in answers)
+        new = torch.tensor([answer + [pad_token_id] * (steps - len(answer)) for answer in answers])
+        if streamer is not None:
+            streamer.put(input_ids)
+            for step in range(steps):
+                streamer.put(new[:, step])
+            streamer.end()
+        return torch.cat([input_ids, new], dim=1)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = InferenceScheduler(UppercaseModel(), CharTokenizer(), max_batch_size=8, max_wait_ms=200)
+    yield scheduler
+    scheduler.close()
+
+
+async def collect(stream):
+    return "".join([chunk async for chunk in stream])
+
+
+def test_compatible_requests_share_a_batch(scheduler):
+    async def scenario():
+        return await asyncio.gather(*(
+            scheduler.generate(prompt, do_sample=False) for prompt in ("abc", "hello", "xy")
+        ))
+
+    assert asyncio.run(scenario()) == ["ABC", "HELLO", "XY"]
+    assert scheduler.model.batches == [3]
+    assert scheduler.stats["batches"] == 1
+
+
+def test_streamed_requests_batch_with_plain_ones(scheduler):
+    async def scenario():
+        return await asyncio.gather(
+            collect(scheduler.stream("stream one", do_sample=False)),
+            scheduler.generate("plain", do_sample=False),
+            collect(scheduler.stream("two", do_sample=False))
+        )
+
+    assert asyncio.run(scenario()) == ["STREAM ONE", "PLAIN", "TWO"]
+    assert scheduler.model.batches == [3]
+
+
+def test_different_parameters_are_not_batched(scheduler):
+    async def scenario():
+        return await asyncio.gather(
+            scheduler.generate("short", max_new_tokens=8),
+            scheduler.generate("long", max_new_tokens=64)
+        )
+
+    assert asyncio.run(scenario()) == ["SHORT", "LONG"]
+    assert sorted(scheduler.model.batches) == [1, 1]
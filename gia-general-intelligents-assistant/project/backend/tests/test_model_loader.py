@@ -0,0 +1,121 @@
+import sys
+from types import SimpleNamespace
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+from app.services.agents import model_loader
+
+
+class StubModel:
+    def eval(self):
+        return self
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Replace the transformers and quantization entry points; returns the calls made"""
+    calls = {"from_pretrained": [], "quantized": 0}
+
+    def from_pretrained(source, **kwargs):
+        calls["from_pretrained"].append(kwargs)
+        return StubModel()
+
+    def quantize_dynamic(model, *args, **kwargs):
+        calls["quantized"] += 1
+        return model
+
+    monkeypatch.setattr(model_loader, "_models", {})
+    monkeypatch.setattr(model_loader.AutoTokenizer, "from_pretrained", lambda source, **kwargs: object())
+    monkeypatch.setattr(model_loader.AutoModelForCausalLM, "from_pretrained", from_pretrained)
+    monkeypatch.setattr(torch.ao.quantization, "quantize_dynamic", quantize_dynamic)
+    return calls
+
+
+def test_modes_are_normalized_and_validated():
+    assert model_loader.resolve_mode(" BFloat16 ", "cpu") == "bfloat16"
+    assert model_loader.resolve_mode(None, "cpu") == "auto"
+    with pytest.raises(ValueError):
+        model_loader.resolve_mode("int4", "cpu")
+    assert model_loader.weights_dtype("auto", "cpu") == torch.float32
+    assert model_loader.weights_dtype("auto", "cuda") == torch.float16
+    assert model_loader.weights_dtype("int8", "cpu") == torch.float32
+
+
+def test_int8_on_cpu_quantizes_linear_layers(monkeypatch, loads):
+    monkeypatch.setattr(torch.backends, "quantized", SimpleNamespace(supported_engines=["x86", "none"]))
+    _, _, stats = model_loader.load_model("stub", "cpu", "int8")
+    assert loads["quantized"] == 1
+    assert loads["from_pretrained"][0]["torch_dtype"] == torch.float32
+    assert stats["mode"] == "int8" and stats["dtype"] == "qint8"
+
+
+def test_int8_falls_back_without_a_quantized_engine(monkeypatch, loads):
+    monkeypatch.setattr(torch.backends, "quantized", SimpleNamespace(supported_engines=["none"]))
+    _, _, stats = model_loader.load_model("stub", "cpu", "int8")
+    assert loads["quantized"] == 0
+    assert loads["from_pretrained"][0]["torch_dtype"] == torch.float32
+    assert stats["mode"] == "auto" and stats["dtype"] == "float32"
+
+
+def test_int8_on_cuda_falls_back_without_bitsandbytes(monkeypatch, loads):
+    monkeypatch.setitem(sys.modules, "bitsandbytes", None)
+    _, _, stats = model_loader.load_model("stub", "cuda", "int8")
+    kwargs = loads["from_pretrained"][0]
+    assert "quantization_config" not in kwargs
+    assert kwargs["torch_dtype"] == torch.float16
+    assert stats["mode"] == "auto"
+
+
+def test_bfloat16_on_cuda_falls_back_to_float16_without_support(monkeypatch):
+    monkeypatch.setattr(torch.cuda, "is_bf16_supported", lambda: False)
+    assert model_loader.resolve_mode("bfloat16", "cuda") == "float16"
+    monkeypatch.setattr(torch.cuda, "is_bf16_supported", lambda: True)
+    assert model_loader.resolve_mode("bfloat16", "cuda") == "bfloat16"
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    """A tiny random GPT-2 with a word-level tokenizer, saved as safetensors"""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import GPT2Config, GPT2LMHeadModel, PreTrainedTokenizerFast
+
+    path = tmp_path_factory.mktemp("tiny-gpt2")
+    words = ["[UNK]", "def", "return", "value", "the", "a", "of", "x", "y", "=", "(", ")"]
+    backend = Tokenizer(models.WordLevel({word: i for i, word in enumerate(words)}, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]", eos_token="[UNK]").save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(words), n_positions=32, n_embd=32, n_layer=2, n_head=2)
+    GPT2LMHeadModel(config).save_pretrained(path, safe_serialization=True)
+    return str(path)
+
+
+def logits(tokenizer, model):
+    inputs = tokenizer("def x ( ) return the value of y", return_tensors="pt")
+    with torch.inference_mode():
+        return model(input_ids=inputs["input_ids"]).logits.float()
+
+
+def test_mmap_safetensors_matches_the_state_dict(checkpoint):
+    from safetensors.torch import load_file
+
+    expected = load_file(f"{checkpoint}/model.safetensors")
+    mapped = model_loader.mmap_safetensors(f"{checkpoint}/model.safetensors")
+    assert mapped.keys() == expected.keys()
+    for name, tensor in expected.items():
+        assert mapped[name].dtype == tensor.dtype
+        assert torch.equal(mapped[name], tensor), name
+
+
+@pytest.mark.parametrize("mode,tolerance", [("auto", 1e-5), ("float32", 1e-5), ("float16", 1e-2), ("bfloat16", 1e-2), ("int8", 1e-2)])
+def test_mmap_load_matches_a_normal_load(monkeypatch, checkpoint, mode, tolerance):
+    monkeypatch.setattr(model_loader, "_models", {})
+    if mode == "int8" and not model_loader._int8_supported("cpu"):
+        pytest.skip("no quantized CPU engine")
+
+    tokenizer, loaded, _ = model_loader.load_model(checkpoint, "cpu", mode)
+    _, mapped, stats = model_loader.load_model(checkpoint, "cpu", mode, mmap=True)
+    assert mapped is not loaded and stats["mmap"]
+    assert torch.allclose(logits(tokenizer, mapped), logits(tokenizer, loaded), atol=tolerance)
@@ -0,0 +1,29 @@
+from app.services.prompt_assembly import estimate_tokens, fit
+
+
+def code_samples(count: int):
+    return [
+        {"repository": f"repo{n}", "file_name": "module.py", "code": f"def task_{n}():\n    return compute_value_{n}()\n"}
+        for n in range(count)
+    ]
+
+
+def test_source_labels_count_against_the_budget():
+    for budget in (24, 40, 60):
+        text, report = fit(code_samples(6), "task 1 compute", budget, estimate_tokens)
+        assert report["kept_tokens"] <= budget
+        assert estimate_tokens(text) <= budget
+
+
+def test_everything_is_kept_when_it_fits():
+    text, report = fit(code_samples(3), "task", 1000, estimate_tokens)
+    assert report["kept_passages"] == report["passages"] == 3
+    assert report["dropped_tokens"] == 0
+    assert [line for line in text.split("\n") if line.startswith("[")] == [
+        "[repo0/module.py]", "[repo1/module.py]", "[repo2/module.py]"
+    ]
+
+
+def test_most_relevant_passage_is_kept():
+    text, _ = fit(code_samples(6), "task_4 compute_value_4", 24, estimate_tokens)
+    assert "task_4" in text
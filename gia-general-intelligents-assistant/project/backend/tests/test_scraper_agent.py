@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+
+web = pytest.importorskip("aiohttp.web")
+from aiohttp.test_utils import TestServer
+from app.services.agents.scraper_agent import ScraperAgent
+
+PAGE = "<html><head><title>Page</title></head><body><main><p>{}</p></main></body></html>"
+
+
+def make_agent(tmp_path, **config):
+    return ScraperAgent({
+        "page_cache_path": str(tmp_path / "pages.db"),
+        "extract_workers": 0,
+        "retries": 0,
+        **config
+    })
+
+
+def test_concurrency_is_limited_globally_and_per_host(tmp_path):
+    in_flight = {"total": 0, "peak": 0}
+    per_host = {}
+
+    async def slow_page(request):
+        host = request.host
+        in_flight["total"] += 1
+        per_host.setdefault(host, {"now": 0, "peak": 0})
+        per_host[host]["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["total"])
+        per_host[host]["peak"] = max(per_host[host]["peak"], per_host[host]["now"])
+        try:
+            await asyncio.sleep(0.05)
+            return web.Response(text=PAGE.format(request.path), content_type="text/html")
+        finally:
+            in_flight["total"] -= 1
+            per_host[host]["now"] -= 1
+
+    async def scenario():
+        agent = make_agent(tmp_path, max_concurrency=3, max_per_host=2, page_cache=False)
+        servers = []
+        for _ in range(2):
+            app = web.Application()
+            app.router.add_get("/{page}", slow_page)
+            server = TestServer(app)
+            await server.start_server()
+            servers.append(server)
+        try:
+            urls = [str(server.make_url(f"/{n}")) for server in servers for n in range(6)]
+            result = await agent.execute({"urls": urls})
+        finally:
+            await agent.cleanup()
+            for server in servers:
+                await server.close()
+        assert [page["status"] for page in result["results"]] == ["success"] * len(urls)
+
+    asyncio.run(scenario())
+    assert in_flight["peak"] == 3
+    assert len(per_host) == 2
+    assert all(host["peak"] <= 2 for host in per_host.values())
+
+
+def test_response_body_is_cut_at_max_bytes(tmp_path):
+    async def big_page(request):
+        return web.Response(text=PAGE.format("x" * 200_000), content_type="text/html")
+
+    async def scenario():
+        agent = make_agent(tmp_path, max_bytes=4096, page_cache=False)
+        app = web.Application()
+        app.router.add_get("/big", big_page)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            html, status, _, truncated = await agent._fetch(agent._get_session(), str(server.make_url("/big")))
+        finally:
+            await agent.cleanup()
+            await server.close()
+        assert status == 200 and truncated
+        assert len(html.encode()) == 4096
+
+    asyncio.run(scenario())
+
+
+def test_stale_page_is_revalidated_with_etag(tmp_path):
+    requests = []
+
+    async def versioned_page(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304, headers={"ETag": '"v1"', "Cache-Control": "max-age=60"})
+        return web.Response(
+            text=PAGE.format("first version"),
+            content_type="text/html",
+            headers={"ETag": '"v1"', "Cache-Control": "max-age=0"}
+        )
+
+    async def scenario():
+        agent = make_agent(tmp_path)
+        app = web.Application()
+        app.router.add_get("/page", versioned_page)
+        server = TestServer(app)
+        await server.start_server()
+        url = str(server.make_url("/page"))
+        try:
+            # max-age=0: stored, but stale at once; the 304 then makes it fresh for 60s
+            states = []
+            for _ in range(3):
+                page = (await agent.execute({"urls": [url]}))["results"][0]
+                assert page["content"]["content"] == "first version"
+                states.append(page["content"]["metadata"]["cache"])
+        finally:
+            await agent.cleanup()
+            await server.close()
+        return states
+
+    assert asyncio.run(scenario()) == ["miss", "revalidated", "hit"]
+    assert requests == [None, '"v1"']